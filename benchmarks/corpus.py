@@ -0,0 +1,158 @@
+"""
+ベンチマーク用の合成アルバム zip を生成する
+（小さい MP3 が多数・巨大な FLAC が少数・大きな ©lyr を持つ M4A、それぞれ無圧縮/deflate）
+"""
+
+import os
+import random
+import struct
+import zipfile
+
+
+# -----------------------------------------------------------------------
+# オーディオファイルの生成
+# -----------------------------------------------------------------------
+
+# MPEG1 Layer3 128kbps 44.1kHz のフレーム（1 フレーム 417 バイト）
+_MP3_FRAME_HEADER = b'\xff\xfb\x90\x64'
+_MP3_FRAME_SIZE = 417
+
+
+def _syncsafe(n: int) -> bytes:
+    return bytes([(n >> 21) & 0x7f, (n >> 14) & 0x7f, (n >> 7) & 0x7f, n & 0x7f])
+
+
+def _id3_frame(frame_id: str, payload: bytes) -> bytes:
+    return frame_id.encode('ascii') + struct.pack('>I', len(payload)) + b'\x00\x00' + payload
+
+
+def make_mp3(rng: random.Random, title: str, lyrics: str, audio_bytes: int) -> bytes:
+    """ID3v2.3 (TIT2/USLT) と MPEG フレームからなる MP3 を生成する"""
+    frames = _id3_frame('TIT2', b'\x03' + title.encode('utf-8'))
+    if lyrics:
+        frames += _id3_frame('USLT', b'\x03eng\x00' + lyrics.encode('utf-8'))
+    head = b'ID3\x03\x00\x00' + _syncsafe(len(frames)) + frames
+    n_frames = max(1, audio_bytes // _MP3_FRAME_SIZE)
+    payload = rng.randbytes(n_frames * (_MP3_FRAME_SIZE - 4))
+    body = b''.join(_MP3_FRAME_HEADER + payload[i:i + _MP3_FRAME_SIZE - 4]
+                    for i in range(0, len(payload), _MP3_FRAME_SIZE - 4))
+    return head + body
+
+
+def make_flac(rng: random.Random, title: str, lyrics: str, audio_bytes: int) -> bytes:
+    """STREAMINFO と VORBIS_COMMENT を持つ FLAC を生成する（音声部分は乱数）"""
+    streaminfo = struct.pack('>HH', 4096, 4096) + b'\x00\x00\x00' * 2
+    streaminfo += ((44100 << 44) | (1 << 41) | (23 << 36) | 44100).to_bytes(8, 'big') + b'\x00' * 16
+    vendor = b'benchmarks'
+    comments = [f'TITLE={title}'.encode('utf-8')]
+    if lyrics:
+        comments.append(f'LYRICS={lyrics}'.encode('utf-8'))
+    vorbis = struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments))
+    for comment in comments:
+        vorbis += struct.pack('<I', len(comment)) + comment
+    out = b'fLaC' + b'\x00' + len(streaminfo).to_bytes(3, 'big') + streaminfo
+    out += b'\x84' + len(vorbis).to_bytes(3, 'big') + vorbis
+    return out + rng.randbytes(audio_bytes)
+
+
+def _atom(name: str, payload: bytes) -> bytes:
+    return struct.pack('>I', 8 + len(payload)) + name.encode('latin-1') + payload
+
+
+def make_m4a(rng: random.Random, title: str, lyrics: str, audio_bytes: int) -> bytes:
+    """moov/udta/meta/ilst (©nam/©lyr) を持つ M4A を生成する"""
+    def data(text: str) -> bytes:
+        return _atom('data', struct.pack('>II', 1, 0) + text.encode('utf-8'))
+    items = _atom('\xa9nam', data(title))
+    if lyrics:
+        items += _atom('\xa9lyr', data(lyrics))
+    hdlr = _atom('hdlr', b'\x00' * 8 + b'mdir' + b'appl' + b'\x00' * 9)
+    meta = _atom('meta', b'\x00\x00\x00\x00' + hdlr + _atom('ilst', items) + _atom('free', b'\x00' * 1024))
+    mvhd = _atom('mvhd', b'\x00' * 12 + struct.pack('>II', 1000, 1000) + b'\x00' * 80)
+    moov = _atom('moov', mvhd + _atom('udta', meta))
+    ftyp = _atom('ftyp', b'M4A \x00\x00\x00\x00M4A mp42isom')
+    return ftyp + moov + _atom('mdat', rng.randbytes(audio_bytes))
+
+
+_MAKERS = {'.mp3': make_mp3, '.flac': make_flac, '.m4a': make_m4a}
+
+
+def make_lyrics(rng: random.Random, nbytes: int) -> str:
+    """おおよそ nbytes バイトの歌詞を生成する"""
+    words = ['la', 'love', 'night', 'sky', 'dream', 'light', 'rain', 'heart', '夜', '空', '夢', '光']
+    lines = []
+    size = 0
+    while size < nbytes:
+        line = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 8)))
+        lines.append(line)
+        size += len(line.encode('utf-8')) + 1
+    return '\n'.join(lines)
+
+
+# -----------------------------------------------------------------------
+# コーパス
+# -----------------------------------------------------------------------
+
+class CorpusSpec:
+    """
+    1種類の合成アルバム群の定義
+    """
+
+    def __init__(self, name: str, ext: str, n_albums: int, n_tracks: int, audio_bytes: int,
+                 lyric_bytes: int, compress_type: int):
+        self.name = name
+        self.ext = ext
+        self.n_albums = n_albums
+        self.n_tracks = n_tracks
+        self.audio_bytes = audio_bytes
+        self.lyric_bytes = lyric_bytes
+        self.compress_type = compress_type
+
+    def scaled(self, scale: float) -> 'CorpusSpec':
+        """アルバム数と音声サイズを scale 倍した定義を返す"""
+        return CorpusSpec(self.name, self.ext, max(1, round(self.n_albums * scale)), self.n_tracks,
+                          max(1024, int(self.audio_bytes * scale)), self.lyric_bytes, self.compress_type)
+
+    def to_dict(self) -> dict:
+        return {'ext': self.ext, 'albums': self.n_albums, 'tracks': self.n_tracks,
+                'audio_bytes': self.audio_bytes, 'lyric_bytes': self.lyric_bytes,
+                'compression': 'deflated' if self.compress_type == zipfile.ZIP_DEFLATED else 'stored'}
+
+
+MB = 1024 * 1024
+
+CORPORA = [
+    CorpusSpec('small-mp3-stored', '.mp3', 10, 20, 256 * 1024, 1024, zipfile.ZIP_STORED),
+    CorpusSpec('small-mp3-deflated', '.mp3', 10, 20, 256 * 1024, 1024, zipfile.ZIP_DEFLATED),
+    CorpusSpec('huge-flac-stored', '.flac', 1, 3, 128 * MB, 2048, zipfile.ZIP_STORED),
+    CorpusSpec('huge-flac-deflated', '.flac', 1, 3, 128 * MB, 2048, zipfile.ZIP_DEFLATED),
+    CorpusSpec('m4a-big-lyrics-stored', '.m4a', 5, 12, 512 * 1024, 64 * 1024, zipfile.ZIP_STORED),
+    CorpusSpec('m4a-big-lyrics-deflated', '.m4a', 5, 12, 512 * 1024, 64 * 1024, zipfile.ZIP_DEFLATED),
+]
+
+
+def build_corpus(spec: CorpusSpec, out_dir: str, seed: int = 0) -> list[str]:
+    """
+    定義に従って '<アーティスト> - <アルバム>.zip' 形式の zip を生成する
+    同じ定義・シードからは同じ内容の zip を生成する
+    Parameters:
+        spec (CorpusSpec): コーパスの定義
+        out_dir (str): 出力先ディレクトリ
+        seed (int): 乱数のシード
+    Returns:
+        list[str]: 生成した zip ファイルのパスのリスト
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(f'{spec.name}:{seed}')
+    make = _MAKERS[spec.ext]
+    zip_files = []
+    for album_no in range(spec.n_albums):
+        zip_path = os.path.join(out_dir, f'Bench {spec.name} - Album {album_no + 1:03d}.zip')
+        with zipfile.ZipFile(zip_path, 'w', spec.compress_type) as zf:
+            for track_no in range(spec.n_tracks):
+                title = f'Track {track_no + 1}'
+                lyrics = make_lyrics(rng, spec.lyric_bytes) if spec.lyric_bytes else None
+                zf.writestr(f'{track_no + 1:02d} {title}{spec.ext}',
+                            make(rng, title, lyrics, spec.audio_bytes))
+        zip_files.append(zip_path)
+    return zip_files
@@ -0,0 +1,221 @@
+"""
+合成コーパスで extract_music_zip の全体と主要な関数の処理時間を計測し、結果を JSON で保存する
+
+使い方:
+    python benchmarks/run_benchmarks.py                  # 全コーパスを計測して results/ に保存
+    python benchmarks/run_benchmarks.py --scale 0.1      # 小さいコーパスで手早く計測
+    python benchmarks/run_benchmarks.py --only small-mp3-stored --repeat 5
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_REPO_ROOT = os.path.dirname(_HERE)
+sys.path.insert(0, os.path.join(_REPO_ROOT, 'src'))
+sys.path.insert(0, os.path.join(_REPO_ROOT, 'tools'))
+
+from corpus import CORPORA, build_corpus
+from extract_lyrics import any_audio_has_lyric, get_audio_files, save_lyrics
+from tag_cache import get_tag_cache
+from diagnose_m4a_tag import _read_mp4_atoms
+
+
+EXTRACT_MUSIC_ZIP = os.path.join(_REPO_ROOT, 'src', 'extract_music_zip.py')
+DEFAULT_RESULTS_DIR = os.path.join(_HERE, 'results')
+
+
+def _measure(func, repeat: int, setup=None) -> dict:
+    """
+    func を repeat 回実行して所要時間を集計する
+    Parameters:
+        func: 計測する関数（戻り値は付加情報の辞書または None）
+        repeat (int): 繰り返し回数
+        setup: 各回の前に実行する関数（計測に含めない）
+    Returns:
+        dict: 最小・中央値・最大 [秒] と付加情報
+    """
+    times = []
+    extra = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        extra = func()
+        times.append(time.perf_counter() - start)
+    result = {'repeat': repeat, 'min': min(times), 'median': statistics.median(times), 'max': max(times)}
+    if extra:
+        result.update(extra)
+    return result
+
+
+def _link_or_copy(src: str, dst_dir: str):
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def bench_end_to_end(zip_files: list[str], work_dir: str, repeat: int, extra_args: list[str]) -> dict:
+    """
+    extract_music_zip.py を別プロセスで実行し、起動から終了までの時間を計測する
+    毎回空のライブラリと zip のコピー（可能ならハードリンク）から始める
+    """
+    search_dir = os.path.join(work_dir, 'search')
+    dst_dir = os.path.join(work_dir, 'library')
+    timings_json = os.path.join(work_dir, 'timings.json')
+    env = dict(os.environ)
+    # 既定の展開先は Windows のユーザーフォルダを前提としているため、計測時は明示する
+    env.setdefault('USERPROFILE', work_dir)
+
+    def setup():
+        shutil.rmtree(search_dir, ignore_errors=True)
+        shutil.rmtree(dst_dir, ignore_errors=True)
+        os.makedirs(search_dir)
+        os.makedirs(dst_dir)
+        for zip_file in zip_files:
+            _link_or_copy(zip_file, search_dir)
+
+    def run():
+        subprocess.run(
+            [sys.executable, EXTRACT_MUSIC_ZIP, '-s', search_dir, '-d', dst_dir,
+             '--old-dir', os.path.join(search_dir, 'old'), '--on-conflict', 'skip',
+             '--timings-json', timings_json, *extra_args],
+            check=True, stdout=subprocess.DEVNULL, env=env)
+        with open(timings_json, encoding='utf-8') as f:
+            spans = json.load(f)['total']['spans']
+        return {'bytes': sum(os.path.getsize(z) for z in zip_files), 'spans': spans}
+
+    result = _measure(run, repeat, setup)
+    result['mb_per_sec'] = result['bytes'] / result['median'] / (1024 * 1024)
+    return result
+
+
+def _album_dirs(library_dir: str) -> list[str]:
+    return sorted(d for d in glob.glob(os.path.join(library_dir, '*', '*')) if os.path.isdir(d))
+
+
+def bench_components(library_dir: str, repeat: int) -> dict:
+    """
+    展開済みのライブラリに対して主要な関数を単独で計測する
+    タグキャッシュは毎回空にし、タグの解析を含めた時間を計測する
+    """
+    album_dirs = _album_dirs(library_dir)
+    audio_files = [f for d in album_dirs for f in get_audio_files(d, recursive=True)]
+    m4a_files = [f for f in audio_files if f.lower().endswith('.m4a')]
+    cache = get_tag_cache()
+
+    results = {}
+    results['get_audio_files'] = _measure(
+        lambda: {'files': sum(len(get_audio_files(d, recursive=True)) for d in album_dirs)}, repeat)
+    results['any_audio_has_lyric'] = _measure(
+        lambda: {'albums': sum(1 for d in album_dirs if any_audio_has_lyric(d))}, repeat, setup=cache.clear)
+    results['save_lyrics'] = _measure(
+        lambda: {'files': len([save_lyrics(d) for d in album_dirs])}, repeat, setup=cache.clear)
+    if m4a_files:
+        results['_read_mp4_atoms'] = _measure(
+            lambda: {'files': len([_read_mp4_atoms(f) for f in m4a_files])}, repeat)
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=_REPO_ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _latest_result(results_dir: str) -> str:
+    files = sorted(glob.glob(os.path.join(results_dir, '*.json')))
+    return files[-1] if files else None
+
+
+def print_comparison(current: dict, previous: dict):
+    """前回の結果と中央値を比較して表示する"""
+    print('')
+    print(f"比較対象: {previous.get('created_at')} (commit {previous.get('git_commit')})")
+    print(f"{'benchmark':<48} {'previous':>10} {'current':>10} {'change':>8}")
+    for corpus_name, benches in current['corpora'].items():
+        for bench_name, result in benches['results'].items():
+            prev = previous.get('corpora', {}).get(corpus_name, {}).get('results', {}).get(bench_name)
+            if prev is None:
+                continue
+            change = (result['median'] - prev['median']) / prev['median'] * 100 if prev['median'] else 0.0
+            print(f"{corpus_name + '/' + bench_name:<48} {prev['median']:>9.4f}s {result['median']:>9.4f}s "
+                  f"{change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成コーパスで処理時間を計測する')
+    parser.add_argument('--only', nargs='+', metavar='CORPUS', choices=[c.name for c in CORPORA],
+                        help='計測するコーパス（省略時はすべて）')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='アルバム数と音声サイズの倍率')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='各計測の繰り返し回数')
+    parser.add_argument('--work-dir', default=None,
+                        help='コーパスと展開先を置くディレクトリ（省略時は一時ディレクトリ）')
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR,
+                        help='結果の保存先')
+    parser.add_argument('--compare', default=None, metavar='RESULT_JSON',
+                        help='比較する過去の結果（省略時は保存先の最新の結果）')
+    parser.add_argument('--extract-args', default='',
+                        help="extract_music_zip.py に追加で渡す引数（例: --extract-args='--raw-copy -j 4'）")
+    args = parser.parse_args()
+
+    specs = [c.scaled(args.scale) for c in CORPORA if not args.only or c.name in args.only]
+    work_root = args.work_dir or tempfile.mkdtemp(prefix='extract-music-zip-bench-')
+    previous_path = args.compare or _latest_result(args.results_dir)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'extract_args': args.extract_args,
+        'corpora': {},
+    }
+    try:
+        for spec in specs:
+            print(f'[{spec.name}] コーパスを生成中 ...', flush=True)
+            corpus_dir = os.path.join(work_root, 'corpus', spec.name)
+            zip_files = sorted(glob.glob(os.path.join(corpus_dir, '*.zip'))) or build_corpus(spec, corpus_dir)
+
+            print(f'[{spec.name}] 計測中 ...', flush=True)
+            run_dir = os.path.join(work_root, 'run', spec.name)
+            results = {'extract_music_zip': bench_end_to_end(zip_files, run_dir, args.repeat,
+                                                             args.extract_args.split())}
+            results.update(bench_components(os.path.join(run_dir, 'library'), args.repeat))
+            report['corpora'][spec.name] = {'spec': spec.to_dict(), 'results': results}
+            for bench_name, result in results.items():
+                print(f"  {bench_name:<24} median {result['median']:.4f}s (min {result['min']:.4f}s)")
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    result_path = os.path.join(args.results_dir, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'結果を保存しました: {result_path}')
+
+    if previous_path:
+        with open(previous_path, encoding='utf-8') as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
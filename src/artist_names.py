@@ -0,0 +1,90 @@
+"""
+アーティスト名の正規化（置換表による置換と、数学用英数字記号の NFKC による折りたたみ）
+"""
+
+import re
+import unicodedata
+
+
+# 数学用英数字記号 (Mathematical Alphanumeric Symbols, U+1D400–U+1D7FF)。'𝙎𝙤𝙧𝙚' のような装飾文字
+_MATH_ALPHANUMERICS = '[\U0001D400-\U0001D7FF]'
+
+
+def load_replacement_table(table_file: str) -> dict[str, str]:
+    """
+    置換表のファイルを読み込む
+    1行に「置換前<TAB>置換後」を書く（UTF-8）。空行と '#' で始まる行は無視する。置換後は空でもよい
+    Parameters:
+        table_file (str): 置換表のファイルのパス
+    Returns:
+        dict[str, str]: 置換前 -> 置換後
+    """
+    table = {}
+    with open(table_file, encoding='utf-8-sig') as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            src, sep, dst = line.partition('\t')
+            if not sep or not src:
+                raise ValueError(f'{table_file}:{lineno}: expected "<from><TAB><to>"')
+            table[src] = dst
+    return table
+
+
+def _trie_pattern(keys: list[str]) -> str:
+    """
+    文字列のリストを、共通の接頭辞をまとめた正規表現にする
+    分岐は先頭の1文字で決まるため、置換表が大きくても1か所あたりの照合は表の大きさに比例しない。
+    各分岐は長い方から試すため、重なる置換前の文字列は最長のものに一致する
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if '' in node:
+            return '(?:' + '|'.join(branches) + ')?' if branches else ''
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return build(trie)
+
+
+class ArtistNameNormalizer:
+    """
+    置換表と数学用英数字記号の折りたたみを1つの正規表現にまとめ、アーティスト名を1回の走査で正規化する
+    置換表の文字列は数学用英数字記号の折りたたみより優先する
+    """
+
+    def __init__(self, table: dict[str, str], fold_math_alphanumerics: bool = False):
+        self.table = {src: dst for src, dst in table.items() if src}
+        self.fold_math_alphanumerics = fold_math_alphanumerics
+        parts = []
+        if self.table:
+            parts.append(_trie_pattern(list(self.table)))
+        if fold_math_alphanumerics:
+            parts.append(_MATH_ALPHANUMERICS)
+        self._pattern = re.compile('|'.join(parts)) if parts else None
+
+    def _replace(self, m: re.Match) -> str:
+        s = m.group(0)
+        dst = self.table.get(s)
+        return dst if dst is not None else unicodedata.normalize('NFKC', s)
+
+    def normalize(self, artist_name: str) -> str:
+        """
+        アーティスト名を正規化する
+        Parameters:
+            artist_name (str): アーティスト名
+        Returns:
+            str: 正規化したアーティスト名
+        """
+        if self._pattern is None:
+            return artist_name
+        return self._pattern.sub(self._replace, artist_name)
@@ -1,24 +1,71 @@
 import glob
-from io import TextIOWrapper
+from io import StringIO, TextIOWrapper
+import json
 import os
-from tinytag import TinyTag
+import sys
+import time
+import zipfile
+from tinytag import TinyTagException
+from library_index import INDEX_FILENAME, LibraryIndex, album_fingerprint, default_index_path, tag_digest
+from tag_cache import configure_tag_pool, get_lyric_fields, get_tag_cache, prefetch_tags, shutdown_tag_pool
+from timing import span
+from zip_tags import read_member_lyric_fields
 
 
 AUDIO_EXTS = ['.mp3', '.flac', '.aac', '.m4a', '.ogg', '.wav', '.aiff']
+_AUDIO_EXT_SET = frozenset(AUDIO_EXTS)
 
+# アーティスト直下の歌詞ファイルの各トラックの位置を記録するサイドカー（'.<歌詞ファイル名>.idx'）
+LYRIC_INDEX_SUFFIX = '.idx'
+# 歌詞ファイルの先頭に書く改行（write_lyric_to_file() の beginning_lfs と同じ）
+_LYRIC_FILE_HEADER = b'\n\n\n'
 
-def get_audio_files(album_dir: str) -> list[str]:
+
+def scan_dir(dir_path: str, recursive: bool = False) -> tuple[list[os.DirEntry], list[str], list[str]]:
+    """
+    ディレクトリを1回だけ走査し、オーディオファイル・歌詞ファイル・サブディレクトリに分類する
+    オーディオファイルは拡張子の大文字小文字を区別せずに判定し、相対パス順に並べて返す。
+    DirEntry は stat 結果を保持するため、後段で stat し直す必要がない
+    Parameters:
+        dir_path (str): ディレクトリのパス
+        recursive (bool): True の場合はサブディレクトリ（複数ディスクのアルバムなど）のオーディオファイルも含める
+    Returns:
+        tuple: (オーディオファイルの DirEntry のリスト, 直下の歌詞ファイルのパスのリスト, 直下のサブディレクトリのパスのリスト)
+    """
+    keyed_entries, lyric_files, sub_dirs = [], [], []
+    pending = [(dir_path, ())]
+    with span('scan_dir') as sp:
+        while pending:
+            current_dir, rel_parts = pending.pop()
+            with os.scandir(current_dir) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if not rel_parts:
+                            sub_dirs.append(entry.path)
+                        if recursive:
+                            pending.append((entry.path, rel_parts + (entry.name,)))
+                    elif not rel_parts and entry.name.endswith('.lyric'):
+                        lyric_files.append(entry.path)
+                    elif is_audio_file(entry.name):
+                        keyed_entries.append((rel_parts + (entry.name,), entry))
+        sp.files = len(keyed_entries)
+    keyed_entries.sort(key=lambda x: x[0])
+    lyric_files.sort()
+    sub_dirs.sort()
+    return [entry for _, entry in keyed_entries], lyric_files, sub_dirs
+
+
+def get_audio_files(album_dir: str, recursive: bool = False) -> list[str]:
     """
     指定されたディレクトリ内のすべての対応オーディオファイルを取得
     Parameters:
         album_dir (str): アルバムディレクトリのパス
+        recursive (bool): True の場合はサブディレクトリも検索する
     Returns:
-        list[str]: オーディオファイルのパスのリスト
+        list[str]: オーディオファイルのパスのリスト（相対パス順）
     """
-    audio_files = []
-    for ext in AUDIO_EXTS:
-        audio_files.extend(glob.glob(os.path.join(album_dir, f'*{ext}')))
-    return audio_files
+    audio_entries, _, _ = scan_dir(album_dir, recursive=recursive)
+    return [entry.path for entry in audio_entries]
 
 
 def get_lyrics(audio_file: str) -> str:
@@ -29,18 +76,7 @@ def get_lyrics(audio_file: str) -> str:
     Returns:
         str: 歌詞文字列。歌詞がない場合は None を返す
     """
-    lyric_str = None
-    tag = TinyTag.get(audio_file)
-    if hasattr(tag, 'other'):
-        if 'lyrics' in tag.other:
-            lyric_str = tag.other['lyrics']
-        elif 'unsyncedlyrics' in tag.other:
-            lyric_str = tag.other['unsyncedlyrics']
-        
-        if isinstance(lyric_str, list):
-            lyric_str = lyric_str[0]
-
-    return lyric_str
+    return get_lyric_fields(audio_file).lyrics
 
 
 def get_track_title(audio_file: str) -> str:
@@ -51,11 +87,7 @@ def get_track_title(audio_file: str) -> str:
     Returns:
         str: トラックタイトル文字列。タイトルがない場合は None を返す
     """
-    title_str = None
-    tag = TinyTag.get(audio_file)
-    if hasattr(tag, 'title'):
-        title_str = tag.title
-    return title_str
+    return get_lyric_fields(audio_file).title
 
 
 def audio_has_lyric(audio_file: str) -> bool:
@@ -70,15 +102,18 @@ def audio_has_lyric(audio_file: str) -> bool:
     return bool(lyric_str and lyric_str.strip())
 
 
-def any_audio_has_lyric(album_dir: str) -> bool:
+def any_audio_has_lyric(album_dir: str, audio_files: list[str] = None) -> bool:
     """
     アルバムディレクトリ内のいずれかのトラックに歌詞が含まれているかを判定
     Parameters:
         album_dir (str): アルバムディレクトリのパス
+        audio_files (list[str]): 対象のオーディオファイル。None の場合はアルバムディレクトリから検索
     Returns:
         bool: 歌詞が含まれているトラックがある場合は True、そうでない場合は False
     """
-    audio_files = get_audio_files(album_dir)
+    if audio_files is None:
+        audio_files = get_audio_files(album_dir)
+    prefetch_tags(audio_files, lyric_only=True)
     
     for filepath in audio_files:
         if audio_has_lyric(filepath):
@@ -86,6 +121,42 @@ def any_audio_has_lyric(album_dir: str) -> bool:
     return False
 
 
+def get_track_digests(audio_files: list[str]) -> dict[str, tuple[str, bool]]:
+    """
+    ライブラリインデックスに登録するタグダイジェストと歌詞の有無を求める
+    Parameters:
+        audio_files (list[str]): オーディオファイルのパスのリスト
+    Returns:
+        dict: オーディオファイルのパス -> (タグダイジェスト, 歌詞の有無)。解析できないファイルは含まない
+    """
+    digests = {}
+    for audio_file in audio_files:
+        try:
+            title = get_track_title(audio_file)
+            lyric_str = get_lyrics(audio_file)
+        except TinyTagException:
+            continue
+        digests[audio_file] = (tag_digest(title, lyric_str), bool(lyric_str and lyric_str.strip()))
+    return digests
+
+
+def get_track_lyrics(audio_files: list[str]) -> dict[str, tuple[str, str]]:
+    """
+    歌詞の全文検索インデックスに登録するタイトルと歌詞を求める
+    Parameters:
+        audio_files (list[str]): オーディオファイルのパスのリスト
+    Returns:
+        dict: オーディオファイルのパス -> (タイトル, 歌詞)。歌詞がない場合は None。解析できないファイルは含まない
+    """
+    track_lyrics = {}
+    for audio_file in audio_files:
+        try:
+            track_lyrics[audio_file] = (get_track_title(audio_file), get_lyrics(audio_file))
+        except TinyTagException:
+            continue
+    return track_lyrics
+
+
 def write_lyric_to_file(audio_file: str, fout: TextIOWrapper, beginning_lfs: bool = True, ending_lfs: bool = True):
     """
     指定されたオーディオファイルの歌詞をファイルに書き込む
@@ -95,11 +166,15 @@ def write_lyric_to_file(audio_file: str, fout: TextIOWrapper, beginning_lfs: boo
         beginning_lfs (bool): 書き込みの前に改行を挿入するかどうか
         ending_lfs (bool): 書き込みの後に改行を挿入するかどうか
     """
+    _write_lyric_text(fout, get_track_title(audio_file), get_lyrics(audio_file), beginning_lfs, ending_lfs)
+
+
+def _write_lyric_text(fout: TextIOWrapper, title: str, lyric_str: str, beginning_lfs: bool, ending_lfs: bool):
     if beginning_lfs:
         fout.write('\n\n\n')
-    fout.write(get_track_title(audio_file) + '\n')
+    # タイトルのないトラック（WAV など）は空行にする
+    fout.write((title or '') + '\n')
 
-    lyric_str = get_lyrics(audio_file)
     if lyric_str:
         fout.write('\n\n' + lyric_str + '\n')
     if ending_lfs:
@@ -115,15 +190,16 @@ def is_audio_file(filepath: str) -> bool:
         bool: 対応するオーディオファイルであれば True、そうでなければ False
     """
     ext = os.path.splitext(filepath)[1].lower()
-    return ext in AUDIO_EXTS
+    return ext in _AUDIO_EXT_SET
 
 
 
-def save_lyrics(album_dir: str, dst_filename: str = None) -> str:
+def save_lyrics(album_dir: str, dst_filename: str = None, audio_files: list[str] = None) -> str:
     """アルバムディレクトリ内のすべてのオーディオファイルから歌詞を抽出し、テキストファイルに保存する
     Parameters:
         album_dir (str): アルバムディレクトリのパス
         dst_filename (str): 保存する歌詞ファイルの名前。None の場合はアルバムディレクトリ名を使用
+        audio_files (list[str]): 対象のオーディオファイル。None の場合はアルバムディレクトリから検索
     Returns:
         str: 保存された歌詞ファイルのパス
     """
@@ -133,14 +209,18 @@ def save_lyrics(album_dir: str, dst_filename: str = None) -> str:
         audio_filename = os.path.basename(audio_filepath)
         lyric_filename = os.path.splitext(audio_filename)[0] + '.lyric'
         dst_filepath = os.path.join(album_dir, lyric_filename)
-        with open(dst_filepath, 'w', encoding='utf-8', newline='\n') as fout:
-            write_lyric_to_file(audio_filepath, fout)
+        with span('save_lyrics', files=1) as sp:
+            with open(dst_filepath, 'w', encoding='utf-8', newline='\n') as fout:
+                write_lyric_to_file(audio_filepath, fout)
+            sp.nbytes = os.path.getsize(dst_filepath)
         return dst_filepath
     
-    audio_files = get_audio_files(album_dir)
+    if audio_files is None:
+        audio_files = get_audio_files(album_dir)
     
     if not audio_files:
         return None
+    prefetch_tags(audio_files, lyric_only=True)
     
 
     if dst_filename is None:
@@ -148,21 +228,363 @@ def save_lyrics(album_dir: str, dst_filename: str = None) -> str:
 
     dst_filepath = os.path.join(album_dir, dst_filename)
 
-    with open(dst_filepath, 'w', encoding='utf-8', newline='\n') as fout:
-        for i, audio_file in enumerate(audio_files):
-            write_lyric_to_file(audio_file, fout, beginning_lfs=(i == 0))
+    with span('save_lyrics', files=len(audio_files)) as sp:
+        with open(dst_filepath, 'w', encoding='utf-8', newline='\n') as fout:
+            for i, audio_file in enumerate(audio_files):
+                write_lyric_to_file(audio_file, fout, beginning_lfs=(i == 0))
+        sp.nbytes = os.path.getsize(dst_filepath)
     
     return dst_filepath
 
 
+def write_zip_lyrics(zip_path: str, fout: TextIOWrapper) -> int:
+    """
+    zip 内のオーディオファイルの歌詞を、展開せずに歌詞ファイルと同じ形式で書き込む
+    タグを解析できないメンバーは読み飛ばす
+    Parameters:
+        zip_path (str): zip ファイルのパス
+        fout (TextIOWrapper): 書き込み先のファイルオブジェクト
+    Returns:
+        int: 書き込んだトラック数
+    """
+    n_tracks = 0
+    with zipfile.ZipFile(zip_path) as zf:
+        infos = sorted((info for info in zf.infolist() if not info.is_dir() and is_audio_file(info.filename)),
+                       key=lambda info: tuple(info.filename.split('/')))
+        with span('save_lyrics', files=len(infos)):
+            for info in infos:
+                try:
+                    fields = read_member_lyric_fields(zf, info)
+                except TinyTagException as e:
+                    print(f'Warning: cannot read tags of {info.filename}: {e}', file=sys.stderr)
+                    continue
+                _write_lyric_text(fout, fields.title, fields.lyrics, n_tracks == 0, True)
+                n_tracks += 1
+    return n_tracks
+
+
+def _lyric_index_path(lyric_path: str) -> str:
+    dir_path, filename = os.path.split(lyric_path)
+    return os.path.join(dir_path, '.' + filename + LYRIC_INDEX_SUFFIX)
+
+
+def _lyric_entry(audio_file: str) -> bytes:
+    """歌詞ファイル中の1トラック分の内容（save_lyrics() が書くものと同じ）"""
+    buf = StringIO()
+    write_lyric_to_file(audio_file, buf, beginning_lfs=False)
+    return buf.getvalue().encode('utf-8')
+
+
+def _load_lyric_index(lyric_path: str) -> dict[str, list[int]]:
+    """
+    サイドカーからトラックごとの位置を読み込む
+    歌詞ファイルがサイドカーの記録後に書き換えられている場合（save_lyrics() での作り直しや手動の編集）は None を返す
+    Returns:
+        dict: トラックのファイル名 -> [オフセット, バイト数]
+    """
+    try:
+        with open(_lyric_index_path(lyric_path), encoding='utf-8') as f:
+            data = json.load(f)
+        st = os.stat(lyric_path)
+    except (OSError, ValueError):
+        return None
+    if data.get('size') != st.st_size or data.get('mtime_ns') != st.st_mtime_ns:
+        return None
+    return data.get('entries')
+
+
+def _write_lyric_index(lyric_path: str, entries: dict[str, list[int]]):
+    st = os.stat(lyric_path)
+    index_path = _lyric_index_path(lyric_path)
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'entries': entries}, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+
+
+def _rebuild_artist_lyrics(artist_dir: str, lyric_path: str) -> str:
+    """アーティストディレクトリ直下の全トラックから歌詞ファイルとサイドカーを作り直す"""
+    audio_files = get_audio_files(artist_dir)
+    prefetch_tags(audio_files, lyric_only=True)
+    entries = {}
+    with span('save_lyrics', files=len(audio_files)) as sp:
+        with open(lyric_path, 'wb') as fout:
+            fout.write(_LYRIC_FILE_HEADER)
+            for audio_file in audio_files:
+                entry = _lyric_entry(audio_file)
+                entries[os.path.basename(audio_file)] = [fout.tell(), len(entry)]
+                fout.write(entry)
+        sp.nbytes = os.path.getsize(lyric_path)
+    _write_lyric_index(lyric_path, entries)
+    return lyric_path
+
+
+def update_artist_lyrics(artist_dir: str, audio_file: str) -> str:
+    """
+    アーティストディレクトリ直下に追加したシングルの分だけ、アーティストの歌詞ファイルを更新する
+    サイドカーに記録した位置をもとに、新しいトラックは末尾に追記し、登録済みのトラックは置き換える。
+    サイドカーがないか古い場合は、ディレクトリ内の全トラックから一度だけ作り直す
+    （追記したトラックはファイル名順ではなく追加順に並ぶ）
+    Parameters:
+        artist_dir (str): アーティストディレクトリのパス
+        audio_file (str): 追加したオーディオファイルのパス（artist_dir 直下）
+    Returns:
+        str: 更新した歌詞ファイルのパス。追加したトラックに歌詞がなく、歌詞ファイルにも載っていない場合は None
+    """
+    lyric_path = os.path.join(artist_dir, os.path.basename(artist_dir) + '.lyric')
+    has_lyric = audio_has_lyric(audio_file)
+    entries = _load_lyric_index(lyric_path)
+    if entries is None:
+        if not os.path.isfile(lyric_path) and not has_lyric:
+            return None
+        return _rebuild_artist_lyrics(artist_dir, lyric_path)
+
+    name = os.path.basename(audio_file)
+    if not has_lyric and name not in entries:
+        # 歌詞のないトラックは、歌詞のあるトラックを置き換える場合だけ書き込む
+        return None
+    entry = _lyric_entry(audio_file)
+    with span('save_lyrics', nbytes=len(entry), files=1):
+        with open(lyric_path, 'r+b') as f:
+            old = entries.get(name)
+            if old is None:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(entry)
+            else:
+                offset, length = old
+                if length == len(entry):
+                    f.seek(offset)
+                    f.write(entry)
+                else:
+                    # 後続のトラックをずらす（タグは読み直さない）
+                    f.seek(offset + length)
+                    tail = f.read()
+                    f.seek(offset)
+                    f.write(entry + tail)
+                    f.truncate()
+                    for other in entries.values():
+                        if other[0] > offset:
+                            other[0] += len(entry) - length
+            entries[name] = [offset, len(entry)]
+    _write_lyric_index(lyric_path, entries)
+    return lyric_path
+
+
+def extract_album_lyrics(album_dir: str, index: LibraryIndex, label: str,
+                         audio_files: list[str] = None, lyric_files: list[str] = None):
+    """
+    1つのアルバムの歌詞ファイルを作成し、ライブラリインデックスを更新する
+    Parameters:
+        album_dir (str): アルバムディレクトリのパス
+        index (LibraryIndex): ライブラリインデックス
+        label (str): 表示用のアルバム名
+        audio_files (list[str]): 走査済みのオーディオファイル。None の場合はアルバムディレクトリから検索
+        lyric_files (list[str]): 走査済みの歌詞ファイル。None の場合はインデックスまたはディレクトリから検索
+    """
+    # *.lyricファイルの存在チェック（インデックス登録済みならディレクトリを走査しない）
+    if lyric_files is None:
+        indexed, lyric_file = index.get_lyric_file(album_dir)
+        if indexed:
+            lyric_files = [lyric_file] if lyric_file is not None and os.path.isfile(lyric_file) else []
+        else:
+            lyric_files = glob.glob(os.path.join(album_dir, '*.lyric'))
+
+    if lyric_files:
+        print(f'[{label}] Lyric file already exists, skipping')
+        if audio_files is not None or not index.has_album(album_dir):
+            index.record_album(album_dir, audio_files or get_audio_files(album_dir, recursive=True), lyric_files[0])
+        return
+
+    if audio_files is None:
+        audio_files = get_audio_files(album_dir, recursive=True)
+    fpath = None
+
+    # 歌詞を含むオーディオファイルの存在チェック
+    if any_audio_has_lyric(album_dir, audio_files=audio_files):
+        print(f'[{label}] Extracting lyrics...')
+        fpath = save_lyrics(album_dir, audio_files=audio_files)
+        if fpath:
+            print(f'[{label}] Saved to: {os.path.basename(fpath)}')
+            index.record_lyrics(album_dir, get_track_lyrics(audio_files))
+        else:
+            print(f'[{label}] Failed to save lyrics')
+    else:
+        print(f'[{label}] No lyrics found')
+        index.record_lyrics(album_dir, {})
+
+    index.record_album(album_dir, audio_files, fpath, get_track_digests(audio_files))
+
+
+def sync_library_lyrics(music_root: str, index: LibraryIndex):
+    """
+    ライブラリ全体を1回だけ走査し、前回からトラックが変化したアルバムだけ歌詞を抽出する
+    アーティストディレクトリ直下のシングルも1つのアルバムとして扱う
+    Parameters:
+        music_root (str): ライブラリのルートディレクトリ
+        index (LibraryIndex): フィンガープリントを保存するライブラリインデックス
+    """
+    n_albums = n_unchanged = 0
+    changed = []
+    _, _, artist_dirs = scan_dir(music_root)
+    for artist_dir in artist_dirs:
+        artist_name = os.path.basename(artist_dir)
+        if artist_name.startswith('.'):
+            continue
+        audio_entries, lyric_files, album_dirs = scan_dir(artist_dir)
+        targets = [(artist_dir, artist_name, audio_entries, lyric_files)]
+        for album_dir in album_dirs:
+            if os.path.basename(album_dir).startswith('.'):
+                # 展開途中のステージングディレクトリなど
+                continue
+            targets.append((album_dir, f'{artist_name}/{os.path.basename(album_dir)}',
+                            *scan_dir(album_dir, recursive=True)[:2]))
+
+        for album_dir, label, audio_entries, lyric_files in targets:
+            if not audio_entries:
+                continue
+            n_albums += 1
+            fingerprint = album_fingerprint(
+                [(os.path.relpath(e.path, album_dir), e.stat().st_size, e.stat().st_mtime_ns)
+                 for e in audio_entries])
+            # トラックが変化しておらず、歌詞ファイルの有無も前回と同じなら開かない
+            _, indexed_lyric_file = index.get_lyric_file(album_dir)
+            if (fingerprint == index.get_album_fingerprint(album_dir)
+                    and bool(indexed_lyric_file) == bool(lyric_files)):
+                n_unchanged += 1
+                continue
+            # DirEntry のまま渡し、タグキャッシュやインデックスで stat し直さないようにする
+            changed.append((album_dir, label, audio_entries, lyric_files))
+
+    # 変化したアルバムのトラックをキャッシュに収まる単位でまとめて先読みし、アルバム順に書き出す
+    batch_limit = max(1, get_tag_cache().max_entries // 2)
+    batch, batch_tracks = [], []
+    for i, (album_dir, label, audio_files, lyric_files) in enumerate(changed):
+        batch.append((album_dir, label, audio_files, lyric_files))
+        if not lyric_files:
+            batch_tracks.extend(audio_files)
+        if len(batch_tracks) >= batch_limit or i == len(changed) - 1:
+            prefetch_tags(batch_tracks, lyric_only=True)
+            for args in batch:
+                extract_album_lyrics(args[0], index, args[1], audio_files=args[2], lyric_files=args[3])
+            batch, batch_tracks = [], []
+
+    print(f'{n_albums} album(s), {n_unchanged} unchanged since last run')
+
+
+def reindex_library_lyrics(index: LibraryIndex):
+    """
+    歌詞ファイルが登録済みの全アルバムのトラックを読み直し、歌詞の全文検索インデックスを作り直す
+    （全文検索インデックスを追加する前に取り込んだライブラリ向け）
+    Parameters:
+        index (LibraryIndex): ライブラリインデックス
+    """
+    album_dirs = index.get_lyric_albums()
+    for album_dir in album_dirs:
+        audio_files = [f for f in index.get_album_tracks(album_dir) or [] if os.path.isfile(f)]
+        prefetch_tags(audio_files, lyric_only=True)
+        index.record_lyrics(album_dir, get_track_lyrics(audio_files))
+    print(f'Reindexed lyrics of {len(album_dirs)} album(s)')
+
+
+def _matching_lines(lyrics: str, phrase: str, max_lines: int = 3) -> list[str]:
+    folded = phrase.casefold()
+    return [line.strip() for line in (lyrics or '').splitlines() if folded in line.casefold()][:max_lines]
+
+
+def search_main(argv: list[str]) -> int:
+    """
+    'search' サブコマンド: ライブラリインデックスの歌詞の全文検索インデックスからフレーズを検索して表示する
+    Parameters:
+        argv (list[str]): 'search' より後のコマンドライン引数
+    Returns:
+        int: 終了コード
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='extract_lyrics.py search',
+        description='search lyrics and titles in the library index for a phrase')
+    parser.add_argument('phrase', nargs='*', help='phrase to search for (words are matched as one phrase)')
+    parser.add_argument('--library', metavar='MUSIC_ROOT', default=None,
+        help=f'library root containing {INDEX_FILENAME}')
+    parser.add_argument('--index-file', default=None,
+        help='library index file (overrides --library)')
+    parser.add_argument('--limit', type=int, default=20,
+        help='max number of tracks to show')
+    parser.add_argument('--reindex', action='store_true',
+        help='rebuild the search index from the tags of every album that has a lyric file')
+    args = parser.parse_args(argv)
+
+    if args.index_file is None and args.library is None:
+        parser.error('--library or --index-file is required')
+    index_file = args.index_file or default_index_path(args.library)
+    if not os.path.isfile(index_file):
+        print(f'Error: {index_file} is not found')
+        return 1
+    if not args.phrase and not args.reindex:
+        parser.error('phrase is required')
+
+    with LibraryIndex(index_file) as index:
+        if not index.has_lyric_search:
+            print('Error: this SQLite build does not support FTS5')
+            return 1
+        if args.reindex:
+            reindex_library_lyrics(index)
+        if not args.phrase:
+            return 0
+        phrase = ' '.join(args.phrase)
+        start = time.perf_counter()
+        hits = index.search_lyrics(phrase, limit=args.limit)
+        elapsed = time.perf_counter() - start
+
+    for artist, album, title, path, lyrics in hits:
+        print(f'{artist} / {album} / {title}')
+        print(f'  {path}')
+        for line in _matching_lines(lyrics, phrase):
+            print(f'    {line}')
+    print(f'{len(hits)} hit(s) in {elapsed * 1000:.1f} ms')
+    return 0
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'search':
+        exit(search_main(sys.argv[2:]))
+    
     import argparse
-    parser = argparse.ArgumentParser()
-    parser.add_argument('artist_dir', help='artist directory path')
+    parser = argparse.ArgumentParser(epilog='run "extract_lyrics.py search -h" to search the lyrics of a library')
+    parser.add_argument('artist_dir', nargs='?',
+        help='artist directory path, or a .zip file to print its lyrics without extracting')
+    parser.add_argument('--library', metavar='MUSIC_ROOT', default=None,
+        help='process every artist under MUSIC_ROOT, skipping albums unchanged since the last run')
+    parser.add_argument('--index-file', default=None,
+        help=f'library index file (default: {INDEX_FILENAME} in the parent of artist_dir, or in MUSIC_ROOT)')
+    parser.add_argument('--tag-workers', type=int, default=1,
+        help='number of workers reading tags in parallel')
+    parser.add_argument('--tag-pool', choices=['thread', 'process'], default='thread',
+        help='worker pool type for --tag-workers')
     args = parser.parse_args()
     
+    configure_tag_pool(args.tag_workers, use_processes=(args.tag_pool == 'process'))
+    
+    if args.library:
+        if not os.path.isdir(args.library):
+            print(f'Error: {args.library} is not a directory')
+            exit(1)
+        index = LibraryIndex(args.index_file or default_index_path(args.library))
+        sync_library_lyrics(args.library, index)
+        index.close()
+        shutdown_tag_pool()
+        print(get_tag_cache().stats_str())
+        print('Done.')
+        exit(0)
+    
+    if args.artist_dir is None:
+        parser.error('artist_dir or --library is required')
+    
     artist_dir = args.artist_dir
     
+    if os.path.isfile(artist_dir) and artist_dir.lower().endswith('.zip'):
+        write_zip_lyrics(artist_dir, sys.stdout)
+        exit(0)
+    
     if not os.path.isdir(artist_dir):
         print(f'Error: {artist_dir} is not a directory')
         exit(1)
@@ -171,7 +593,7 @@ if __name__ == '__main__':
     album_dirs = [
         os.path.join(artist_dir, item)
         for item in os.listdir(artist_dir)
-        if os.path.isdir(os.path.join(artist_dir, item))
+        if os.path.isdir(os.path.join(artist_dir, item)) and not item.startswith('.')
     ]
     
     if not album_dirs:
@@ -180,25 +602,13 @@ if __name__ == '__main__':
     
     print(f'Found {len(album_dirs)} album directory(ies)')
     
+    index_file = args.index_file or default_index_path(os.path.dirname(os.path.abspath(artist_dir)))
+    index = LibraryIndex(index_file)
+    
     for album_dir in album_dirs:
-        album_name = os.path.basename(album_dir)
-        
-        # *.lyricファイルの存在チェック
-        lyric_files = glob.glob(os.path.join(album_dir, '*.lyric'))
-        
-        if lyric_files:
-            print(f'[{album_name}] Lyric file already exists, skipping')
-            continue
-        
-        # 歌詞を含むオーディオファイルの存在チェック
-        if any_audio_has_lyric(album_dir):
-            print(f'[{album_name}] Extracting lyrics...')
-            fpath = save_lyrics(album_dir)
-            if fpath:
-                print(f'[{album_name}] Saved to: {os.path.basename(fpath)}')
-            else:
-                print(f'[{album_name}] Failed to save lyrics')
-        else:
-            print(f'[{album_name}] No lyrics found')
+        extract_album_lyrics(album_dir, index, os.path.basename(album_dir))
     
+    index.close()
+    shutdown_tag_pool()
+    print(get_tag_cache().stats_str())
     print('Done.')
@@ -1,12 +1,31 @@
 
 import os
+import sys
+import io
 import argparse
+import asyncio
+import cProfile
+import contextlib
 import glob
-import zipfile
+import json
 import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from tinytag import TinyTag
 
-from extract_lyrics import any_audio_has_lyric, audio_has_lyric, save_lyrics, get_audio_files
-from extract_lyrics import AUDIO_EXTS
+from extract_lyrics import any_audio_has_lyric, audio_has_lyric, save_lyrics, get_audio_files, update_artist_lyrics
+from extract_lyrics import AUDIO_EXTS, is_audio_file, get_track_digests, get_track_lyrics
+from library_index import INDEX_FILENAME, LibraryIndex, default_index_path
+from tag_cache import get_tag_cache
+from lyric_reader import LyricFields, read_lyric_fields
+from transfer import UNSUPPORTED_COPY_ERRNOS, move_file
+from zip_tags import member_data_offset
+from artist_names import ArtistNameNormalizer, load_replacement_table
+from zip_verify import DEFAULT_VERIFY_WORKERS, VerifyResult, verify_zip
+from timing import ItemTimings, format_throughput, item_scope, new_item, span, summary_str, write_report
+from folder_watcher import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS, FolderWatcher
 
 def get_user_folder():
     return os.environ.get('HOMEPATH') or os.environ.get('USERPROFILE')
@@ -22,9 +41,141 @@ def parse_args():
     parser.add_argument('--old-dir', 
         default=os.path.join('.', 'old'),
         help='directory to store .zip file extraction was done')
+    parser.add_argument('-j', '--jobs',
+        type=int, default=1,
+        help='number of zip files processed in parallel')
+    parser.add_argument('--on-conflict',
+        choices=['ask', 'skip', 'overwrite', 'merge', 'ask-at-end'],
+        default='ask',
+        help='what to do when the album dir already has audio files: '
+             'ask (prompt immediately), skip, overwrite (delete existing tracks first), '
+             'merge (extract over them), ask-at-end (prompt after all other work is done)')
+    parser.add_argument('--raw-copy',
+        action='store_true',
+        help='copy uncompressed (STORED) members straight from the zip with copy_file_range; '
+             'faster, but skips the CRC check done by zipfile')
+    parser.add_argument('--verify',
+        action='store_true',
+        help='check the central directory and the CRC-32 of every member before extracting; '
+             'corrupt zips are moved to --quarantine-dir without writing anything to dst dir')
+    parser.add_argument('--verify-workers',
+        type=int, default=DEFAULT_VERIFY_WORKERS,
+        help='number of workers reading members in parallel for --verify (one member per task)')
+    parser.add_argument('--quarantine-dir',
+        default=os.path.join('.', 'corrupt'),
+        help='directory to move .zip files that failed --verify into')
+    parser.add_argument('--dedup',
+        choices=['off', 'skip', 'link'],
+        default='off',
+        help='compare zip members with the library by CRC32 and size before extracting: '
+             'skip (skip albums whose tracks are all in the library), '
+             'link (also hardlink identical tracks instead of extracting them), '
+             'off (default; duplicates go through --on-conflict)')
+    parser.add_argument('--pipeline',
+        action='store_true',
+        help='run extraction, tag scanning and lyric writing as overlapping stages '
+             '(--jobs extraction workers feed one scan and one write stage)')
+    parser.add_argument('--queue-size',
+        type=int, default=2,
+        help='max number of albums waiting between pipeline stages')
+    parser.add_argument('--watch',
+        action='store_true',
+        help='keep running and process zip/audio files as soon as they finish downloading into search dir')
+    parser.add_argument('--poll-interval',
+        type=float, default=DEFAULT_POLL_INTERVAL,
+        help='seconds between scans of search dir in --watch mode when inotify is not available')
+    parser.add_argument('--settle-seconds',
+        type=float, default=DEFAULT_SETTLE_SECONDS,
+        help='a file is treated as downloaded when its size and mtime do not change for this many seconds')
+    parser.add_argument('--timings-json',
+        metavar='PATH', default=None,
+        help="write per-album and total timings, bytes and file counts as JSON ('-' for stdout)")
+    parser.add_argument('--profile',
+        metavar='PATH', default=None,
+        help='dump cProfile stats of the run (main thread only) to PATH')
+    parser.add_argument('--index-file',
+        default=None,
+        help=f'library index file (default: {INDEX_FILENAME} in dst dir)')
+    parser.add_argument('--artist-map',
+        metavar='PATH', default=None,
+        help='UTF-8 text file of artist name replacements, one "<from><TAB><to>" per line '
+             '(lines starting with # are ignored); added to the built-in list')
+    parser.add_argument('--fold-math-alphanumerics',
+        action='store_true',
+        help='turn Unicode mathematical alphanumerics in artist names (U+1D400-U+1D7FF) '
+             'into plain letters and digits with NFKC')
     return parser.parse_args()
 
 
+# 並列処理時にコンソール出力と input() を直列化するためのロック
+_console_lock = threading.RLock()
+
+_path_locks: dict[str, threading.RLock] = {}
+_path_locks_guard = threading.Lock()
+
+
+def path_lock(path: str) -> threading.RLock:
+    """指定されたディレクトリに対応するロックを取得する
+    Parameters:
+        path (str): ディレクトリのパス
+    Returns:
+        threading.RLock: パスごとに共有されるロック
+    """
+    key = os.path.normcase(os.path.abspath(path))
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = threading.RLock()
+        return lock
+
+
+class OutputBuffer:
+    """1つの zip ファイルに関する出力をまとめて表示するためのバッファ
+
+    buffered=False の場合は print() と同じくそのまま出力する
+    """
+
+    def __init__(self, buffered: bool):
+        self.buffered = buffered
+        self._buf = io.StringIO()
+
+    def print(self, *values, end: str = '\n'):
+        if self.buffered:
+            print(*values, end=end, file=self._buf)
+        else:
+            print(*values, end=end, flush=True)
+
+    def flush(self):
+        """溜めた出力を他の zip の出力と混ざらないように一括で書き出す"""
+        if not self.buffered:
+            return
+        text = self._buf.getvalue()
+        self._buf = io.StringIO()
+        if text:
+            with _console_lock:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+
+
+def you_want_to_extract_anyway(out: OutputBuffer) -> bool:
+    """展開を続行するかをユーザーに確認する
+    Parameters:
+        out (OutputBuffer): 確認前に書き出す出力バッファ
+    Returns:
+        bool: 続行する場合は True
+    """
+    with _console_lock:
+        out.flush()
+        while True:
+            ans = input('Extract anyway ? [yes/NO] >>> ')
+            if ans.lower() in ['', 'n', 'no']:
+                return False
+            elif ans.lower() in ['y', 'yes']:
+                return True
+            else:
+                print('Answer \'yes\' or \'no\'.')
+
+
 def split_artist_and_album(file_path: str):
     """ファイル名からアーティスト名とアルバム名を分離して取得する
     Parameters:
@@ -37,6 +188,17 @@ def split_artist_and_album(file_path: str):
     return stem.split(' - ', maxsplit=1)   # don't care " - " in artist name
 
 
+# 1回の実行の間、作成（確認）済みのサブディレクトリと、アーティスト名 -> アーティストディレクトリの対応を覚えておく
+_prepared_dirs: set[str] = set()
+_artist_dirs: dict[tuple[str, str], str] = {}
+
+
+def forget_prepared_directories():
+    """作成済みのディレクトリの記憶を消す（--watch では処理の合間に削除されることがあるため）"""
+    _prepared_dirs.clear()
+    _artist_dirs.clear()
+
+
 def prepare_sub_directory(dst_dir: str, subdir_name: str) -> str:
     """指定されたディレクトリ内にサブディレクトリを作成し、そのパスを返す
     Parameters:
@@ -46,8 +208,12 @@ def prepare_sub_directory(dst_dir: str, subdir_name: str) -> str:
         str: 作成されたサブディレクトリのパス
     """
     subdir_path = os.path.join(dst_dir, subdir_name)
-    if not os.path.isdir(subdir_path):
-        os.mkdir(subdir_path)
+    if subdir_path in _prepared_dirs:
+        return subdir_path
+    with path_lock(subdir_path):
+        if not os.path.isdir(subdir_path):
+            os.mkdir(subdir_path)
+    _prepared_dirs.add(subdir_path)
     return subdir_path
 
 
@@ -55,15 +221,944 @@ ARTIST_NAME_REPL_LIST = {
     '𝙎𝙤𝙧𝙚𝙘𝙖𝙪𝙨𝙖𝙦𝙞𝙘𝙝': 'Sorecausaqich'
 }
 
+_artist_name_normalizer = ArtistNameNormalizer(ARTIST_NAME_REPL_LIST)
+
+
+def configure_artist_names(table_file: str = None, fold_math_alphanumerics: bool = False):
+    """
+    アーティスト名の正規化を設定する
+    Parameters:
+        table_file (str): 置換表のファイル。ARTIST_NAME_REPL_LIST に追加し、同じ置換前の文字列は上書きする
+        fold_math_alphanumerics (bool): 数学用英数字記号を NFKC で通常の英数字にする
+    """
+    global _artist_name_normalizer
+    table = dict(ARTIST_NAME_REPL_LIST)
+    if table_file:
+        table.update(load_replacement_table(table_file))
+    _artist_name_normalizer = ArtistNameNormalizer(table, fold_math_alphanumerics)
+    _artist_dirs.clear()
+
+
 def replace_unwanted_artist_name(artist_name: str):
-    s = artist_name
-    for k, v in ARTIST_NAME_REPL_LIST.items():
-        s = s.replace(k, v)
-    return s
+    return _artist_name_normalizer.normalize(artist_name)
+
+
+def artist_dir_for(dst_dir: str, artist_name: str, create: bool = False) -> str:
+    """正規化したアーティスト名のディレクトリのパスを返す（同じアーティスト名は1回だけ解決する）
+    Parameters:
+        dst_dir (str): 展開先のディレクトリ
+        artist_name (str): ファイル名から取り出したアーティスト名（正規化前）
+        create (bool): True の場合はディレクトリを作成する
+    Returns:
+        str: アーティストディレクトリのパス
+    """
+    key = (dst_dir, artist_name)
+    artist_dir = _artist_dirs.get(key)
+    if artist_dir is None:
+        artist_dir = _artist_dirs[key] = os.path.join(dst_dir, replace_unwanted_artist_name(artist_name))
+    if create:
+        prepare_sub_directory(dst_dir, os.path.basename(artist_dir))
+    return artist_dir
+
+
+# 展開中にタグ解析用としてメモリに保持する先頭バイト数
+TAG_HEAD_BYTES = 1024 * 1024
+# 展開時のコピーバッファ（スレッドごとに確保して使い回す）
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+_copy_buffers = threading.local()
+
+
+def _get_copy_buffer() -> memoryview:
+    buf = getattr(_copy_buffers, 'buf', None)
+    if buf is None:
+        buf = _copy_buffers.buf = memoryview(bytearray(COPY_BUFFER_SIZE))
+    return buf
+
+
+class _TeeTagReader(io.RawIOBase):
+    """展開中に保持した先頭部分をメモリから返し、それ以外は展開先ファイルから読むリーダー
+
+    タグはほとんどの形式で先頭にあるため、展開と同じパスで解析できる。
+    moov が末尾にある m4a などは、書き込んだ直後の展開先ファイル（ページキャッシュ上）から読む
+    """
+
+    def __init__(self, head: bytes, size: int, fallback_path: str):
+        self._head = head
+        self._size = size
+        self._fallback_path = fallback_path
+        self._fallback = None
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        n = 0
+        if self._pos < len(self._head):
+            chunk = self._head[self._pos:self._pos + len(view)]
+            view[:len(chunk)] = chunk
+            n = len(chunk)
+        if n < len(view) and self._pos + n < self._size:
+            if self._fallback is None:
+                self._fallback = open(self._fallback_path, 'rb')
+            self._fallback.seek(self._pos + n)
+            n += self._fallback.readinto(view[n:])
+        self._pos += n
+        return n
+
+    def close(self):
+        if self._fallback is not None:
+            self._fallback.close()
+            self._fallback = None
+        super().close()
+
+
+def _member_dst_path(info: zipfile.ZipInfo, dst_dir: str) -> str:
+    """zip メンバーの展開先パスを ZipFile.extractall と同じ規則で求める"""
+    arcname = info.filename.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    invalid_path_parts = ('', os.path.curdir, os.path.pardir)
+    arcname = os.path.sep.join(x for x in arcname.split(os.path.sep)
+                               if x not in invalid_path_parts)
+    if os.path.sep == '\\':
+        # Windows でファイル名に使えない文字を置き換える
+        table = str.maketrans(':<>|"?*', '_______')
+        arcname = os.path.sep.join(x.translate(table).rstrip('.')
+                                   for x in arcname.split(os.path.sep))
+        arcname = os.path.sep.join(x for x in arcname.split(os.path.sep) if x)
+    return os.path.join(dst_dir, arcname)
+
+
+def _preallocate(fd: int, size: int):
+    """展開先ファイルの領域を先に確保して断片化を抑える（未対応の環境では何もしない）"""
+    if size > 0 and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            pass
+
+
+def _parse_tag_from_head(head: bytes, size: int, dst_path: str) -> TinyTag | LyricFields:
+    """
+    展開中に保持した先頭バイト列からタグを解析する。解析できない場合は None を返す
+    後段では歌詞とタイトルしか使わないため、まず軽量なリーダーで読み、対応していない形式だけ TinyTag で解析する
+    """
+    try:
+        with _TeeTagReader(head, size, dst_path) as reader:
+            with span('lyric_tag', files=1):
+                fields = read_lyric_fields(dst_path, reader)
+            if fields is not None:
+                return fields
+            reader.seek(0)
+            with span('tag', files=1):
+                tag = TinyTag.get(filename=dst_path, file_obj=reader)
+    except Exception:
+        # 解析できないファイルは後段で通常どおり読み直す
+        return None
+    # キャッシュ中のタグが先頭バイト列を保持し続けないようにする
+    tag._filehandler = None
+    return tag
+
+
+def _extract_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, dst_path: str, parse_tag: bool) -> TinyTag | LyricFields:
+    """zip メンバーを展開してディスクに書き出し、必要であれば同じパスでタグを解析する
+    Returns:
+        TinyTag | LyricFields: 解析したタグ。parse_tag が False か解析できない場合は None
+    """
+    buf = _get_copy_buffer()
+    head = bytearray()
+    with zf.open(info) as src, open(dst_path, 'wb') as dst:
+        _preallocate(dst.fileno(), info.file_size)
+        while True:
+            n = src.readinto(buf)
+            if not n:
+                break
+            dst.write(buf[:n])
+            if parse_tag and len(head) < TAG_HEAD_BYTES:
+                head += buf[:min(n, TAG_HEAD_BYTES - len(head))]
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    return _parse_tag_from_head(bytes(head), info.file_size, dst_path) if parse_tag else None
+
+
+def _raw_copy_member(zip_fd: int, info: zipfile.ZipInfo, dst_path: str,
+                     parse_tag: bool) -> tuple[bool, TinyTag | LyricFields]:
+    """無圧縮のメンバーを zip から copy_file_range で直接コピーする
+    Returns:
+        tuple: (コピーできたかどうか, 解析したタグ)
+    """
+    if (info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1
+            or not hasattr(os, 'copy_file_range')):
+        return False, None
+    data_offset = member_data_offset(zip_fd, info)
+    with open(dst_path, 'wb') as dst:
+        _preallocate(dst.fileno(), info.file_size)
+        copied = 0
+        try:
+            while copied < info.file_size:
+                n = os.copy_file_range(zip_fd, dst.fileno(), info.file_size - copied,
+                                       data_offset + copied, copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno in UNSUPPORTED_COPY_ERRNOS:
+                return False, None
+            raise
+        os.fsync(dst.fileno())
+    if copied != info.file_size:
+        raise zipfile.BadZipFile(f'Truncated member: {info.filename}')
+
+    if not parse_tag:
+        return True, None
+    head = os.pread(zip_fd, min(TAG_HEAD_BYTES, info.file_size), data_offset)
+    return True, _parse_tag_from_head(head, info.file_size, dst_path)
+
+
+class ExtractStats:
+    """extract_zip() で展開したバイト数と所要時間"""
+
+    def __init__(self):
+        self.nbytes = 0
+        self.seconds = 0.0
+        self.raw_copied = 0
+        self.linked = 0
+        self.resumed = 0
+
+    def __str__(self) -> str:
+        text = format_throughput(self.nbytes, self.seconds)
+        if self.raw_copied:
+            text += f', {self.raw_copied} raw copied'
+        if self.resumed:
+            text += f', {self.resumed} resumed'
+        return text
+
+
+def _link_member(src_path: str, dst_path: str) -> bool:
+    """取り込み済みの同一トラックをハードリンクする。できなかった場合は False を返す"""
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        # 別ボリュームや展開先に別のファイルがある場合などは通常どおり展開する
+        return False
+    return True
+
+
+# 展開途中のファイルはアルバムディレクトリの隣のステージングディレクトリに置き、
+# 展開し終えてからアルバムディレクトリへ rename する。
+# ステージングディレクトリ内のジャーナルに展開済みのメンバーを記録し、中断後は続きから展開する
+STAGING_SUFFIX = '.partial'
+JOURNAL_FILENAME = '.journal'
+
+
+def staging_dir_for(album_dir: str) -> str:
+    """アルバムディレクトリに対応するステージングディレクトリのパスを返す"""
+    parent_dir, album_dirname = os.path.split(os.path.abspath(album_dir))
+    return os.path.join(parent_dir, f'.{album_dirname}{STAGING_SUFFIX}')
+
+
+def _zip_identity(zip_file: str) -> dict:
+    st = os.stat(zip_file)
+    return {'zip': os.path.basename(zip_file), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def _load_journal(journal_path: str, identity: dict) -> dict[str, int]:
+    """
+    ジャーナルから展開済みのメンバーを読み込む
+    Returns:
+        dict: メンバー名 -> サイズ。ジャーナルがないか別の zip のものであれば None
+    """
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    try:
+        if not lines or json.loads(lines[0]) != identity:
+            return None
+    except ValueError:
+        return None
+    done = {}
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            # 書き込み途中で中断された行
+            break
+        done[record['member']] = record['size']
+    return done
+
+
+def _fsync_dir(dir_path: str):
+    """rename したディレクトリエントリをディスクに反映する（Windows では不要なため何もしない）"""
+    if os.name != 'posix':
+        return
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _commit_staging(staging_dir: str, album_dir: str):
+    """展開し終えたステージングディレクトリの内容をアルバムディレクトリへ移す"""
+    if os.path.isdir(album_dir) and os.listdir(album_dir):
+        # 既存のアルバムにマージする場合はファイルごとに置き換える
+        for root, _, files in os.walk(staging_dir):
+            target_dir = os.path.normpath(os.path.join(album_dir, os.path.relpath(root, staging_dir)))
+            os.makedirs(target_dir, exist_ok=True)
+            for name in files:
+                os.replace(os.path.join(root, name), os.path.join(target_dir, name))
+        shutil.rmtree(staging_dir)
+    else:
+        if os.path.isdir(album_dir):
+            os.rmdir(album_dir)
+        os.rename(staging_dir, album_dir)
+    _fsync_dir(os.path.dirname(os.path.abspath(album_dir)))
+
+
+def read_zip_digests(zip_file: str, album_dir: str) -> dict[str, tuple[int, int]]:
+    """zip の中央ディレクトリからオーディオファイルのサイズと CRC32 を取得する（展開はしない）
+    Parameters:
+        zip_file (str): zip ファイルのパス
+        album_dir (str): 展開先のアルバムディレクトリ
+    Returns:
+        dict: 展開先のパス -> (サイズ, CRC32)
+    """
+    with zipfile.ZipFile(zip_file, 'r') as zf:
+        return {_member_dst_path(info, album_dir): (info.file_size, info.CRC)
+                for info in zf.infolist()
+                if not info.is_dir() and info.file_size > 0 and is_audio_file(info.filename)}
+
+
+def find_identical_tracks(zip_digests: dict[str, tuple[int, int]], index: LibraryIndex) -> dict[str, str]:
+    """サイズと CRC32 が一致する取り込み済みのトラックを探す
+    Parameters:
+        zip_digests (dict): read_zip_digests() の結果
+        index (LibraryIndex): ライブラリインデックス
+    Returns:
+        dict: 展開先のパス -> 一致した取り込み済みトラックのパス
+    """
+    identical = {}
+    for dst_path, (size, crc32) in zip_digests.items():
+        existing = index.find_identical_track(size, crc32)
+        if existing is not None:
+            identical[dst_path] = existing
+    return identical
+
+
+def extract_zip(zip_file: str, album_dir: str, link_sources: dict[str, str] = None,
+                raw_copy: bool = False, stats: ExtractStats = None) -> list[str]:
+    """zip ファイルをステージングディレクトリに展開してからアルバムディレクトリへ移し、
+    展開と同時にオーディオファイルのタグを解析する。前回中断した展開があれば続きから展開する
+    Parameters:
+        zip_file (str): zip ファイルのパス
+        album_dir (str): 展開先のアルバムディレクトリ
+        link_sources (dict): 展開先のパス -> 展開せずにハードリンクする同一内容のファイルのパス
+        raw_copy (bool): 無圧縮のメンバーを copy_file_range で直接コピーする
+        stats (ExtractStats): 展開したバイト数と所要時間の格納先
+    Returns:
+        list[str]: 展開したオーディオファイルのパス（get_audio_files と同じ相対パス順）
+    """
+    link_sources = link_sources or {}
+    stats = stats if stats is not None else ExtractStats()
+    nbytes_before = stats.nbytes
+    with span('extract') as sp:
+        start = time.perf_counter()
+
+        staging_dir = staging_dir_for(album_dir)
+        journal_path = os.path.join(staging_dir, JOURNAL_FILENAME)
+        identity = _zip_identity(zip_file)
+        done_members = _load_journal(journal_path, identity)
+        if done_members is None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            os.makedirs(staging_dir)
+            done_members = {}
+            with open(journal_path, 'w', encoding='utf-8') as journal:
+                journal.write(json.dumps(identity) + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+
+        audio_files = []
+        tags = {}
+        cache = get_tag_cache()
+        with zipfile.ZipFile(zip_file, 'r') as zf, \
+                open(journal_path, 'a', encoding='utf-8') as journal, \
+                open(zip_file, 'rb') if raw_copy else contextlib.nullcontext() as zip_raw:
+            for info in zf.infolist():
+                dst_path = _member_dst_path(info, album_dir)
+                stage_path = _member_dst_path(info, staging_dir)
+                if info.is_dir():
+                    os.makedirs(stage_path, exist_ok=True)
+                    continue
+                parent_dir = os.path.dirname(stage_path)
+                if parent_dir:
+                    os.makedirs(parent_dir, exist_ok=True)
+
+                is_audio = is_audio_file(dst_path)
+                if is_audio:
+                    audio_files.append(dst_path)
+
+                if (info.filename in done_members and os.path.isfile(stage_path)
+                        and os.path.getsize(stage_path) == done_members[info.filename]):
+                    stats.resumed += 1
+                    continue
+
+                link_source = link_sources.get(dst_path)
+                if link_source is not None and os.path.exists(dst_path) and (
+                        os.path.normcase(os.path.abspath(link_source)) == os.path.normcase(os.path.abspath(dst_path))):
+                    # 展開先に同じ内容のファイルが既にある
+                    continue
+                if link_source is not None and _link_member(link_source, stage_path):
+                    stats.linked += 1
+                    if cache.contains(link_source):
+                        tags[dst_path] = cache.get(link_source)
+                else:
+                    copied, tag = False, None
+                    if zip_raw is not None:
+                        copied, tag = _raw_copy_member(zip_raw.fileno(), info, stage_path, is_audio)
+                        stats.raw_copied += copied
+                    if not copied:
+                        tag = _extract_member(zf, info, stage_path, parse_tag=is_audio)
+                    if tag is not None:
+                        tags[dst_path] = tag
+                    stats.nbytes += info.file_size
+
+                journal.write(json.dumps({'member': info.filename, 'size': info.file_size}) + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+
+        os.remove(journal_path)
+        _commit_staging(staging_dir, album_dir)
+        # rename してもサイズと更新時刻は変わらないため、展開中に解析したタグをそのまま登録できる
+        for dst_path, tag in tags.items():
+            cache.put(dst_path, tag)
+
+        stats.seconds += time.perf_counter() - start
+        sp.nbytes = stats.nbytes - nbytes_before
+        sp.files = len(audio_files)
+    audio_files.sort(key=lambda f: os.path.relpath(f, album_dir).split(os.sep))
+    return audio_files
+
+
+# process_zip_file() の処理結果
+ZIP_DONE = 'done'
+ZIP_SKIPPED = 'skipped'
+ZIP_DEFERRED = 'deferred'
+ZIP_QUARANTINED = 'quarantined'
+
+
+def _remove_album_tracks(album_dir: str, audio_files: list[str]):
+    """上書き展開の前に、既存のトラックとアルバム直下の歌詞ファイルを削除する"""
+    lyric_files = glob.glob(os.path.join(album_dir, '*.lyric'))
+    for f in audio_files + lyric_files:
+        try:
+            os.remove(f)
+        except FileNotFoundError:
+            pass
+
+
+class ZipJob:
+    """1つの zip ファイルの処理状態（展開 → タグの走査 → 歌詞の書き出しの各段階で引き継ぐ）"""
+
+    def __init__(self, zip_file: str, album_dir: str, out: OutputBuffer):
+        self.zip_file = zip_file
+        self.zip_basename = os.path.basename(zip_file)
+        # verify_zip_stage() で隔離した zip では None のまま（アーティストディレクトリを作らない）
+        self.album_dir = album_dir
+        self.out = out
+        self.verified: VerifyResult = None
+        self.zip_digests: dict[str, tuple[int, int]] = {}
+        # 既存のトラックとマージした場合は True（アルバム全体を対象にする）
+        self.merged = False
+        self.album_audios: list[str] = None
+        self.has_lyric = False
+        self.track_digests: dict[str, tuple[str, bool]] = None
+        self.timings: ItemTimings = new_item('zip', self.zip_basename)
+
+
+def album_dir_for_zip(zip_file: str, args: argparse.Namespace) -> str:
+    """zip ファイル名から展開先のアルバムディレクトリを求める
+    ディレクトリは作成しない（展開するときにステージングディレクトリと一緒に作成する）。
+    スキップや隔離した zip のために空のアーティストディレクトリを残さないため
+    Parameters:
+        zip_file (str): zip ファイルのパス
+        args (argparse.Namespace): コマンドライン引数
+    Returns:
+        str: アルバムディレクトリのパス
+    """
+    zip_basename = os.path.basename(zip_file)
+    album_dirname, _ = os.path.splitext(zip_basename)
+
+    artist_name, album_name = split_artist_and_album(zip_basename)
+    
+    artist_dir = artist_dir_for(args.dst_dir, artist_name)
+    return os.path.join(artist_dir, album_dirname)
+
+
+def verify_zip_stage(job: ZipJob, args: argparse.Namespace) -> str:
+    """--verify の場合、展開先に何も書き込む前に zip を検証し、壊れていれば隔離ディレクトリへ移動する
+    Parameters:
+        job (ZipJob): 処理中の zip ファイル
+        args (argparse.Namespace): コマンドライン引数
+    Returns:
+        str: 隔離した場合は ZIP_QUARANTINED、それ以外は None
+    """
+    if not args.verify:
+        return None
+    out = job.out
+    job.verified = verify_zip(job.zip_file, args.verify_workers)
+    if job.verified.encrypted:
+        out.print(f'[WARN] {job.zip_basename}: CRC-32 of encrypted members was not checked (password required):')
+        for name in job.verified.encrypted:
+            out.print(f'[WARN]   {name}')
+    if job.verified.ok:
+        return None
+    out.print(f'[WARN] {job.zip_basename} is corrupt:')
+    for error in job.verified.errors:
+        out.print(f'[WARN]   {error}')
+    os.makedirs(args.quarantine_dir, exist_ok=True)
+    moved = move_file(job.zip_file, args.quarantine_dir)
+    out.print(f'[INFO] Quarantined : {job.zip_basename} (moved to quarantine dir: {moved})')
+    return ZIP_QUARANTINED
+
+
+def extract_zip_stage(job: ZipJob, args: argparse.Namespace, index: LibraryIndex, on_conflict: str = None) -> str:
+    """既存のトラックを確認して zip ファイルを展開し、処理済みの zip を移動する
+    呼び出し元でアルバムディレクトリのロックを確保していること
+    Parameters:
+        job (ZipJob): 処理中の zip ファイル
+        args (argparse.Namespace): コマンドライン引数
+        index (LibraryIndex): ライブラリインデックス
+        on_conflict (str): アルバムディレクトリに既存のトラックがある場合の方針。None の場合は args.on_conflict
+    Returns:
+        str: ZIP_DONE, ZIP_SKIPPED, ZIP_DEFERRED, ZIP_QUARANTINED のいずれか
+    """
+    on_conflict = on_conflict or args.on_conflict
+    zip_file, zip_basename, album_dir, out = job.zip_file, job.zip_basename, job.album_dir, job.out
+
+    # compare the central directory with the library before touching anything
+    job.zip_digests = read_zip_digests(zip_file, album_dir)
+    identical_tracks = {} if args.dedup == 'off' else find_identical_tracks(job.zip_digests, index)
+    if job.zip_digests and len(identical_tracks) == len(job.zip_digests):
+        out.print(f'[INFO] All tracks in {zip_basename} are already in the library:')
+        for existing_dir in sorted({os.path.dirname(f) for f in identical_tracks.values()}):
+            out.print(f'[INFO]   {existing_dir}')
+        if os.path.exists(os.path.join(args.old_dir, zip_basename)):
+            # 取り込み済みの zip を再ダウンロードした場合など。old dir の同名の zip は上書きしない
+            out.print(f'[INFO] Skipped : {zip_basename} (left in place: old dir already has a zip with this name)')
+            return ZIP_SKIPPED
+        os.makedirs(args.old_dir, exist_ok=True)
+        moved = move_file(zip_file, args.old_dir)
+        out.print(f'[INFO] Skipped : {zip_basename} (moved to old dir: {moved})')
+        return ZIP_SKIPPED
+
+    # the album dir itself is created when the staged extraction is renamed into place
+    album_existed = os.path.isdir(album_dir)
+
+    # check if already audio files are stored in album_dir,
+    # in order to avoid duplicating processes.
+    # (the library index answers this without listing the directory)
+    if not album_existed:
+        already_exist_audios = []
+    else:
+        already_exist_audios = index.get_album_tracks(album_dir)
+        if already_exist_audios is None:
+            already_exist_audios = get_audio_files(album_dir, recursive=True)
+    if already_exist_audios:
+        exist_audios = [os.path.basename(f) for f in already_exist_audios]
+        out.print(f'[WARN] Before Extracting {zip_basename}:')
+        out.print(f'[WARN]   Some audio files are stored in')
+        out.print(f'[WARN]   destination album dir: {album_dir}')
+        out.print(f'[WARN]   ' + \
+            '\n[WARN]   '.join(exist_audios))
+        out.print('')
+        
+        if on_conflict == 'ask-at-end':
+            # 他の処理を止めないよう、確認は最後にまとめて行う
+            out.print(f'[INFO] Deferred : {zip_basename}')
+            return ZIP_DEFERRED
+        if on_conflict == 'skip' or (on_conflict == 'ask' and not you_want_to_extract_anyway(out)):
+            out.print(f'[INFO] Skipped : {zip_basename}')
+            return ZIP_SKIPPED
+        if on_conflict == 'overwrite':
+            out.print(f'[INFO] Removing existing tracks in {album_dir}')
+            _remove_album_tracks(album_dir, already_exist_audios)
+            # 削除したトラックの登録と歌詞の検索用の行も消す（展開後に新しいトラックで登録し直す）
+            index.forget_album(album_dir)
+            already_exist_audios = []
+            # 削除したトラックは同じ内容のトラックとして使えない（展開し直す）
+            identical_tracks = {dst: src for dst, src in identical_tracks.items() if os.path.exists(src)}
+    
+    # extract zip
+    out.print(f'[{zip_basename}]')
+    if job.verified is not None:
+        out.print(f'  Verified CRC-32 ({job.verified}, {job.verified.seconds:.2f} s)')
+    out.print(f'  Extracting to "{album_dir}" ... ', end='')
+    link_sources = identical_tracks if args.dedup == 'link' else None
+    extract_stats = ExtractStats()
+    extracted_audios = extract_zip(zip_file, album_dir, link_sources, args.raw_copy, extract_stats)
+    out.print(f'OK ({extract_stats})')
+    if extract_stats.linked:
+        out.print(f'  {extract_stats.linked} identical track(s) were hardlinked.')
+    
+    # move the processed zip file into 'old' directory
+    os.makedirs(args.old_dir, exist_ok=True)
+    moved = move_file(zip_file, args.old_dir)
+    out.print(f'  Moved zip into "{args.old_dir}" ({moved})')
+    
+    # 既存のトラックとマージした場合はアルバム全体を対象にする
+    job.merged = bool(already_exist_audios)
+    job.album_audios = None if job.merged else extracted_audios
+    return ZIP_DONE
+
+
+def scan_zip_stage(job: ZipJob):
+    """展開したアルバムのタグを走査し、歌詞の有無とタグのダイジェストを求める
+    Parameters:
+        job (ZipJob): extract_zip_stage() を終えた zip ファイル
+    """
+    # (tags were parsed while extracting, so this does not re-read the files)
+    if job.album_audios is None:
+        job.album_audios = get_audio_files(job.album_dir, recursive=True)
+    job.has_lyric = any_audio_has_lyric(job.album_dir, audio_files=job.album_audios)
+    job.track_digests = get_track_digests(job.album_audios)
+
+
+def write_zip_stage(job: ZipJob, index: LibraryIndex):
+    """歌詞ファイルを書き出し、アルバムをライブラリインデックスに登録する
+    Parameters:
+        job (ZipJob): scan_zip_stage() を終えた zip ファイル
+        index (LibraryIndex): ライブラリインデックス
+    """
+    out = job.out
+    # extract lyrics and save as text file
+    saved_lyric_file = None
+    if job.has_lyric:
+        out.print(f'  Some lyrics are found.')
+        saved_lyric_file = save_lyrics(job.album_dir, audio_files=job.album_audios)
+        out.print(f'  Extracted lyrics into file:')
+        out.print(f'    {saved_lyric_file}')
+        index.record_lyrics(job.album_dir, get_track_lyrics(job.album_audios))
+    elif job.merged:
+        _, saved_lyric_file = index.get_lyric_file(job.album_dir)
+    if not job.has_lyric:
+        # 上書き・マージで歌詞のあるトラックがなくなった場合に、前のトラックが検索にかからないようにする
+        index.record_lyrics(job.album_dir, {})
+
+    track_crcs = {f: crc32 for f, (_, crc32) in job.zip_digests.items()}
+    index.record_album(job.album_dir, job.album_audios, saved_lyric_file, job.track_digests, track_crcs)
+
+
+def process_zip_file(zip_file: str, args: argparse.Namespace, out: OutputBuffer, index: LibraryIndex,
+                     on_conflict: str = None) -> str:
+    """1つの zip ファイルを展開し、処理済みの zip を移動して歌詞を抽出する
+    Parameters:
+        zip_file (str): zip ファイルのパス
+        args (argparse.Namespace): コマンドライン引数
+        out (OutputBuffer): 出力先
+        index (LibraryIndex): ライブラリインデックス
+        on_conflict (str): アルバムディレクトリに既存のトラックがある場合の方針。None の場合は args.on_conflict
+    Returns:
+        str: ZIP_DONE, ZIP_SKIPPED, ZIP_DEFERRED, ZIP_QUARANTINED のいずれか
+    """
+    job = ZipJob(zip_file, None, out)
+    with item_scope(job.timings):
+        status = verify_zip_stage(job, args)
+    if status is not None:
+        job.timings.finish(status)
+        return status
+    job.album_dir = album_dir_for_zip(zip_file, args)
+
+    # 同じアルバムディレクトリへの展開が並列に走らないようにする
+    with path_lock(job.album_dir), item_scope(job.timings):
+        status = extract_zip_stage(job, args, index, on_conflict)
+        if status == ZIP_DONE:
+            scan_zip_stage(job)
+            write_zip_stage(job, index)
+    job.timings.finish(status)
+    return status
+
+
+def _process_zip_file_buffered(zip_file: str, args: argparse.Namespace, index: LibraryIndex) -> str:
+    out = OutputBuffer(buffered=True)
+    try:
+        return process_zip_file(zip_file, args, out, index)
+    finally:
+        out.flush()
+
+
+class PipelineMonitor:
+    """パイプラインの各ステージの待ち行列の長さを記録する"""
+
+    def __init__(self, queues: dict[str, asyncio.Queue]):
+        self.queues = queues
+        self.max_depths = {name: 0 for name in queues}
+
+    def sample(self):
+        for name, queue in self.queues.items():
+            self.max_depths[name] = max(self.max_depths[name], queue.qsize())
+
+    def depths_str(self) -> str:
+        return 'queue depth: ' + ', '.join(f'{name}={queue.qsize()}' for name, queue in self.queues.items())
+
+    def max_depths_str(self) -> str:
+        return 'max queue depth: ' + ', '.join(f'{name}={depth}' for name, depth in self.max_depths.items())
+
+
+def _run_in_item_scope(item: ItemTimings, func, *args):
+    # ワーカースレッドで記録した区間を処理中の zip に集計する
+    with item_scope(item):
+        return func(*args)
+
+
+async def _run_zip_pipeline(zip_files: list[str], args: argparse.Namespace, index: LibraryIndex,
+                            keep_going: bool) -> list[tuple[str, str]]:
+    """
+    展開 → タグの走査 → 歌詞の書き出しを別々のステージで重ねて実行する
+    展開は --jobs 個のワーカーで行い、後段が詰まっている間は待ち行列の上限で展開を止める
+    Returns:
+        list[tuple]: (zip ファイルのパス, 処理結果) のリスト
+    """
+    loop = asyncio.get_running_loop()
+    extract_queue: asyncio.Queue[str] = asyncio.Queue()
+    scan_queue: asyncio.Queue[ZipJob] = asyncio.Queue(maxsize=args.queue_size)
+    write_queue: asyncio.Queue[ZipJob] = asyncio.Queue(maxsize=args.queue_size)
+    for zip_file in zip_files:
+        extract_queue.put_nowait(zip_file)
+    monitor = PipelineMonitor({'extract': extract_queue, 'scan': scan_queue, 'write': write_queue})
+
+    # 同じアルバムへの zip は前の zip が全ステージを終えるまで展開しない
+    album_locks: dict[str, asyncio.Lock] = {}
+    results: list[tuple[str, str]] = []
+    errors: list[Exception] = []
+
+    def finish(job: ZipJob, status: str, error: Exception = None):
+        if error is not None:
+            job.out.print(f'[ERROR] {job.zip_basename}: {error}')
+            errors.append(error)
+        else:
+            results.append((job.zip_file, status))
+        job.timings.finish(status or 'error')
+        if status == ZIP_DONE:
+            job.out.print(f'  ({monitor.depths_str()})')
+        job.out.flush()
+        if job.album_dir is not None:
+            album_locks[job.album_dir].release()
+
+    async def extract_worker():
+        while not extract_queue.empty():
+            zip_file = extract_queue.get_nowait()
+            monitor.sample()
+            job = ZipJob(zip_file, None, OutputBuffer(buffered=True))
+            try:
+                status = await loop.run_in_executor(executor, _run_in_item_scope, job.timings,
+                                                    verify_zip_stage, job, args)
+            except Exception as e:
+                finish(job, None, e)
+                continue
+            if status is not None:
+                finish(job, status)
+                continue
+            try:
+                job.album_dir = album_dir_for_zip(zip_file, args)
+            except Exception as e:
+                # album_dir は None のままなので、finish() はアルバムのロックを解放しない
+                finish(job, None, e)
+                continue
+            lock = album_locks.setdefault(job.album_dir, asyncio.Lock())
+            await lock.acquire()
+            try:
+                status = await loop.run_in_executor(executor, _run_in_item_scope, job.timings,
+                                                    extract_zip_stage, job, args, index)
+            except Exception as e:
+                finish(job, None, e)
+                continue
+            if status != ZIP_DONE:
+                finish(job, status)
+                continue
+            # 後段の待ち行列が一杯の間はここで待つ
+            await scan_queue.put(job)
+            monitor.sample()
+
+    async def scan_worker():
+        while (job := await scan_queue.get()) is not None:
+            try:
+                await loop.run_in_executor(executor, _run_in_item_scope, job.timings, scan_zip_stage, job)
+            except Exception as e:
+                finish(job, None, e)
+                continue
+            await write_queue.put(job)
+            monitor.sample()
+        await write_queue.put(None)
+
+    async def write_worker():
+        while (job := await write_queue.get()) is not None:
+            try:
+                await loop.run_in_executor(executor, _run_in_item_scope, job.timings, write_zip_stage, job, index)
+            except Exception as e:
+                finish(job, None, e)
+                continue
+            finish(job, ZIP_DONE)
+
+    with ThreadPoolExecutor(max_workers=args.jobs + 2) as executor:
+        scan_task = asyncio.create_task(scan_worker())
+        write_task = asyncio.create_task(write_worker())
+        await asyncio.gather(*(extract_worker() for _ in range(max(1, args.jobs))))
+        await scan_queue.put(None)
+        await asyncio.gather(scan_task, write_task)
+
+    print(monitor.max_depths_str())
+    if errors and not keep_going:
+        raise errors[0]
+    return results
+
+
+def process_zip_files(zip_files: list[str], args: argparse.Namespace, index: LibraryIndex,
+                      keep_going: bool = False) -> list[str]:
+    """複数の zip ファイルを処理する（--jobs が 2 以上の場合は並列に処理する）
+    Parameters:
+        zip_files (list[str]): zip ファイルのパスのリスト
+        args (argparse.Namespace): コマンドライン引数
+        index (LibraryIndex): ライブラリインデックス
+        keep_going (bool): True の場合は失敗した zip を報告して残りの処理を続ける
+    Returns:
+        list[str]: 確認を後回しにした zip ファイルのパスのリスト
+    """
+    results = []
+    if args.pipeline:
+        results = asyncio.run(_run_zip_pipeline(zip_files, args, index, keep_going))
+    elif args.jobs > 1:
+        with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(_process_zip_file_buffered, zip_file, args, index)
+                       for zip_file in zip_files]
+            for zip_file, future in zip(zip_files, futures):
+                try:
+                    results.append((zip_file, future.result()))
+                except Exception as e:
+                    if not keep_going:
+                        raise
+                    print(f'[ERROR] {os.path.basename(zip_file)}: {e}')
+    else:
+        for zip_file in zip_files:
+            try:
+                results.append((zip_file, process_zip_file(zip_file, args, OutputBuffer(buffered=False), index)))
+            except Exception as e:
+                if not keep_going:
+                    raise
+                print(f'[ERROR] {os.path.basename(zip_file)}: {e}')
+    return [zip_file for zip_file, result in results if result == ZIP_DEFERRED]
+
+
+def resolve_deferred_zip_files(deferred_zip_files: list[str], args: argparse.Namespace, index: LibraryIndex):
+    """--on-conflict ask-at-end で後回しにした zip ファイルについて確認して処理する"""
+    if not deferred_zip_files:
+        return
+    print('')
+    print(f'{len(deferred_zip_files)} zip files are waiting for confirmation.')
+    for zip_file in deferred_zip_files:
+        process_zip_file(zip_file, args, OutputBuffer(buffered=False), index, on_conflict='ask')
+
+
+def process_audio_file(audio_file: str, args: argparse.Namespace, index: LibraryIndex):
+    """シングルのオーディオファイルをアーティストディレクトリへ移動して歌詞を抽出する
+    Parameters:
+        audio_file (str): オーディオファイルのパス
+        args (argparse.Namespace): コマンドライン引数
+        index (LibraryIndex): ライブラリインデックス
+    """
+    audio_basename = os.path.basename(audio_file)
+    timings = new_item('single', audio_basename)
+    with item_scope(timings):
+        artist_name, _ = split_artist_and_album(audio_basename)
+        artist_dir = artist_dir_for(args.dst_dir, artist_name, create=True)
+        print(f'[{audio_basename}]')
+        print(f'  Moving to "{artist_dir}" ... ', end='')
+        moved = move_file(audio_file, artist_dir)
+        moved_path = moved.dst
+        print(f'OK ({moved})')
+
+        saved_lyric_file = None
+        try:
+            if audio_has_lyric(moved_path):
+                print(f'  Some lyrics are found.')
+            # アーティストの歌詞ファイルは全トラックから作り直さず、このトラックの分だけ更新する
+            saved_lyric_file = update_artist_lyrics(artist_dir, moved_path)
+        except Exception as e:
+            # 移動は済んでいるため、歌詞ファイルを更新できなくてもインデックスへの登録は続ける
+            print(f'  [ERROR] Failed to update lyrics file: {e}')
+        if saved_lyric_file:
+            print(f'  Updated lyrics file:')
+            print(f'    {saved_lyric_file}')
+        # 歌詞のないトラックで置き換えた場合は、前のトラックの登録が消える
+        index.record_lyrics(artist_dir, get_track_lyrics([moved_path]), whole_album=False)
+        index.record_track(artist_dir, moved_path, saved_lyric_file, get_track_digests([moved_path]))
+    timings.finish(ZIP_DONE)
+
+
+def _is_watch_target(filename: str) -> bool:
+    return filename.endswith('.zip') or is_audio_file(filename)
+
+
+def watch_search_dir(args: argparse.Namespace, index: LibraryIndex):
+    """search dir を監視し、ダウンロードが終わった zip ファイルとシングルを順に処理し続ける
+    Parameters:
+        args (argparse.Namespace): コマンドライン引数
+        index (LibraryIndex): ライブラリインデックス
+    """
+    with FolderWatcher(args.search_dir, _is_watch_target,
+                       poll_interval=args.poll_interval, settle_seconds=args.settle_seconds) as watcher:
+        print(f'watching {args.search_dir} ({watcher.method}) ... press Ctrl+C to stop')
+        for ready_files in watcher.batches():
+            forget_prepared_directories()
+            zip_files = [f for f in ready_files if f.endswith('.zip')]
+            audio_files = [f for f in ready_files if is_audio_file(f)]
+            print('')
+            print(f'{len(zip_files)} zip files and {len(audio_files)} audio files are ready.')
+            deferred_zip_files = process_zip_files(zip_files, args, index, keep_going=True)
+            for audio_file in audio_files:
+                try:
+                    process_audio_file(audio_file, args, index)
+                except Exception as e:
+                    print(f'[ERROR] {os.path.basename(audio_file)}: {e}')
+            resolve_deferred_zip_files(deferred_zip_files, args, index)
+            print(get_tag_cache().stats_str())
+
+
+def _finish_run(args: argparse.Namespace, profiler: cProfile.Profile):
+    """実行の最後に集計と cProfile の結果を出力する"""
+    print(get_tag_cache().stats_str())
+    print(summary_str())
+    if args.timings_json:
+        write_report(args.timings_json)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f'profile stats: {args.profile}')
 
 
 if __name__ == "__main__":
     args = parse_args()
+    configure_artist_names(args.artist_map, args.fold_math_alphanumerics)
 
     print(f'search dir: {args.search_dir}')
     print(f'dst dir:    {args.dst_dir}')
@@ -75,66 +1170,31 @@ if __name__ == "__main__":
     if not os.path.isdir(args.dst_dir):
         raise RuntimeError(f'dst dir is not found ({args.dst_dir})')
 
+    index = LibraryIndex(args.index_file or default_index_path(args.dst_dir))
+
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if args.watch:
+        try:
+            watch_search_dir(args, index)
+        except KeyboardInterrupt:
+            print('')
+            print('Stopped watching.')
+        index.close()
+        _finish_run(args, profiler)
+        print('Done.')
+        sys.exit(0)
+
     print('searching zip file...')
     zip_files = glob.glob(os.path.join(args.search_dir, '*.zip'))
+    deferred_zip_files = []
 
     if zip_files:
         print(f'{len(zip_files)} zip files was found.')
-
-        for zip_file in zip_files:
-            zip_basename = os.path.basename(zip_file)
-            album_dirname, _ = os.path.splitext(zip_basename)
-
-            artist_name, album_name = split_artist_and_album(zip_basename)
-            
-            artist_name = replace_unwanted_artist_name(artist_name)
-            
-            artist_dir = prepare_sub_directory(args.dst_dir, artist_name)
-            album_dir = prepare_sub_directory(artist_dir, album_dirname)
-
-            # check if already audio files are stored in album_dir,
-            # in order to avoid duplicating processes.
-            already_exist_audios = get_audio_files(album_dir)
-            if already_exist_audios:
-                exist_audios = [os.path.basename(f) for f in already_exist_audios]
-                print(f'[WARN] Before Extracting {zip_basename}:')
-                print(f'[WARN]   Some audio files are stored in')
-                print(f'[WARN]   destination album dir: {album_dir}')
-                print(f'[WARN]   ' + \
-                    '\n[WARN]   '.join(exist_audios))
-                print('')
-                
-                def you_want_to_extract_anyway() -> bool:
-                    while True:
-                        ans = input('Extract anyway ? [yes/NO] >>> ')
-                        if ans.lower() in ['', 'n', 'no']:
-                            return False
-                        elif ans.lower() in ['y', 'yes']:
-                            return True
-                        else:
-                            print('Answer \'yes\' or \'no\'.')
-                
-                if not you_want_to_extract_anyway():
-                    print(f'[INFO] Skipped : {zip_basename}')
-                    continue
-            
-            # extract zip
-            print(f'[{zip_basename}]')
-            print(f'  Extracting to "{album_dir}" ... ', end='')
-            with zipfile.ZipFile(zip_file, 'r') as zf:
-                zf.extractall(path=album_dir)
-            print('OK')
-            
-            # move the processed zip file into 'old' directory
-            os.makedirs(args.old_dir, exist_ok=True)
-            shutil.move(zip_file, args.old_dir)
-            
-            # extract lyrics and save as text file
-            if any_audio_has_lyric(album_dir):
-                print(f'  Some lyrics are found.')
-                saved_lyric_file = save_lyrics(album_dir)
-                print(f'  Extracted lyrics into file:')
-                print(f'    {saved_lyric_file}')
+        deferred_zip_files = process_zip_files(zip_files, args, index)
     else:
         print('Zip file was not found.')
     
@@ -145,21 +1205,13 @@ if __name__ == "__main__":
     if audio_files:
         print(f'{len(audio_files)} audio files was found.')
         for audio_file in audio_files:
-            audio_basename = os.path.basename(audio_file)
-            artist_name, _ = split_artist_and_album(audio_basename)
-            artist_name = replace_unwanted_artist_name(artist_name)
-            artist_dir = prepare_sub_directory(args.dst_dir, artist_name)
-            print(f'[{audio_basename}]')
-            print(f'  Moving to "{artist_dir}" ... ', end='')
-            moved_path = shutil.move(audio_file, artist_dir)
-            print('OK')
-
-            if audio_has_lyric(moved_path):
-                print(f'  Some lyrics are found.')
-                saved_lyric_file = save_lyrics(artist_dir)
-                print(f'  Extracted lyrics into file:')
-                print(f'    {saved_lyric_file}')
+            process_audio_file(audio_file, args, index)
     else:
         print('Audio file was not found.')
 
+    # resolve conflicts deferred by --on-conflict ask-at-end
+    resolve_deferred_zip_files(deferred_zip_files, args, index)
+
+    index.close()
+    _finish_run(args, profiler)
     print('Done.')
@@ -0,0 +1,150 @@
+"""
+ダウンロードフォルダを監視し、書き込みが終わったファイルを順に返す
+Linux では inotify で変更を待ち、それ以外の環境では一定間隔でポーリングする
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from typing import Callable, Iterator
+
+
+DEFAULT_POLL_INTERVAL = 2.0
+# サイズと更新時刻がこの秒数変化しなければダウンロードが終わったとみなす
+DEFAULT_SETTLE_SECONDS = 3.0
+
+# inotify のイベント（ファイルの作成・書き込み終了・フォルダへの移動）
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class _Inotify:
+    """ctypes 経由の inotify。イベントの内容は見ず、フォルダを走査し直す合図にだけ使う"""
+
+    def __init__(self, dir_path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(dir_path),
+                                    _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f'inotify_add_watch failed: {dir_path}')
+
+    def wait(self, timeout: float):
+        """イベントが届くか timeout 秒経つまで待つ"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self.fd, 64 * 1024):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    フォルダ直下のファイルを監視し、サイズと更新時刻が落ち着いたものを返す
+    一度返したファイルは、内容が変わらない限り再び返さない（スキップされて残った zip など）
+    """
+
+    def __init__(self, dir_path: str, match: Callable[[str], bool],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS):
+        self.dir_path = dir_path
+        self.match = match
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        # path -> (size, mtime_ns, 変化を最後に確認した時刻)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        # path -> (size, mtime_ns)
+        self._handled: dict[str, tuple[int, int]] = {}
+        self._inotify = None
+        if sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify(dir_path)
+            except (OSError, AttributeError):
+                self._inotify = None
+
+    @property
+    def method(self) -> str:
+        return 'inotify' if self._inotify is not None else 'polling'
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _scan(self) -> list[str]:
+        """フォルダを走査し、落ち着いたファイルのパスを返す"""
+        now = time.monotonic()
+        seen = set()
+        ready = []
+        with os.scandir(self.dir_path) as it:
+            for entry in it:
+                if not entry.is_file() or not self.match(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                path = entry.path
+                seen.add(path)
+                state = (st.st_size, st.st_mtime_ns)
+                if self._handled.get(path) == state:
+                    continue
+                pending = self._pending.get(path)
+                if pending is None or pending[:2] != state:
+                    self._pending[path] = (*state, now)
+                elif now - pending[2] >= self.settle_seconds:
+                    del self._pending[path]
+                    self._handled[path] = state
+                    ready.append(path)
+        # 消えたファイル（処理済みで移動されたものなど）の記録を捨てる
+        for path in list(self._pending):
+            if path not in seen:
+                del self._pending[path]
+        for path in list(self._handled):
+            if path not in seen:
+                del self._handled[path]
+        return sorted(ready)
+
+    def _wait(self):
+        if self._pending:
+            # 落ち着くのを待っているファイルがあれば、その判定に間に合うように起きる
+            timeout = min(self.poll_interval, self.settle_seconds)
+        else:
+            timeout = self.poll_interval
+        if self._inotify is not None:
+            self._inotify.wait(None if not self._pending else timeout)
+        else:
+            time.sleep(timeout)
+
+    def batches(self) -> Iterator[list[str]]:
+        """
+        書き込みが終わったファイルのリストを見つかるたびに返し続ける
+        Returns:
+            Iterator[list[str]]: 落ち着いたファイルのパスのリスト
+        """
+        while True:
+            ready = self._scan()
+            if ready:
+                yield ready
+            self._wait()
@@ -0,0 +1,386 @@
+"""
+取り込み済みのアルバム・トラックを記録するライブラリインデックス (SQLite)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+INDEX_FILENAME = '.library_index.sqlite3'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS albums (
+    path        TEXT PRIMARY KEY,
+    artist      TEXT,
+    album       TEXT,
+    lyric_file  TEXT,
+    updated_at  REAL,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    path        TEXT PRIMARY KEY,
+    album_path  TEXT NOT NULL,
+    size        INTEGER,
+    mtime_ns    INTEGER,
+    tag_digest  TEXT,
+    has_lyric   INTEGER,
+    crc32       INTEGER
+);
+CREATE INDEX IF NOT EXISTS tracks_album_path ON tracks (album_path);
+"""
+
+# 歌詞の全文検索インデックス。lyric_docs の id を lyrics_fts の rowid として対応付ける
+_LYRIC_SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lyric_docs (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT UNIQUE NOT NULL,
+    album_path  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lyric_docs_album_path ON lyric_docs (album_path);
+CREATE VIRTUAL TABLE IF NOT EXISTS lyrics_fts USING fts5 (artist, album, title, lyrics, tokenize = '{tokenizer}');
+"""
+
+# 日本語のように単語を空白で区切らない歌詞でも部分一致で検索できるよう trigram を使う。
+# trigram を使えない古い SQLite では unicode61（空白・記号区切り）にする
+_LYRIC_SEARCH_TOKENIZERS = ['trigram', 'unicode61']
+# trigram では 3 文字未満の語句をインデックスで検索できない
+_TRIGRAM_MIN_CHARS = 3
+
+
+def default_index_path(library_root: str) -> str:
+    """ライブラリルート直下のインデックスファイルのパスを返す"""
+    return os.path.join(library_root, INDEX_FILENAME)
+
+
+def album_fingerprint(tracks: list[tuple[str, int, int]]) -> str:
+    """
+    アルバム内のトラックのファイル名・サイズ・更新時刻からフィンガープリントを求める
+    Parameters:
+        tracks (list[tuple]): (ファイル名, サイズ, 更新時刻 [ns]) のリスト
+    Returns:
+        str: フィンガープリント文字列
+    """
+    h = hashlib.sha1()
+    for name, size, mtime_ns in sorted(tracks):
+        h.update(f'{name}\0{size}\0{mtime_ns}\n'.encode('utf-8'))
+    return h.hexdigest()
+
+
+def tag_digest(title: str, lyrics: str) -> str:
+    """
+    タイトルと歌詞からタグのダイジェストを求める
+    Parameters:
+        title (str): トラックタイトル
+        lyrics (str): 歌詞
+    Returns:
+        str: ダイジェスト文字列 (sha1 の先頭 16 桁)
+    """
+    h = hashlib.sha1()
+    h.update((title or '').encode('utf-8'))
+    h.update(b'\0')
+    h.update((lyrics or '').encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+class LibraryIndex:
+    """
+    ライブラリルート配下のアルバム/トラックのパス・サイズ・更新時刻・タグダイジェスト・
+    歌詞ファイルの有無を記録する。パスはライブラリルートからの相対パスで保存する
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.root = os.path.dirname(os.path.abspath(index_path))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.commit()
+        self.lyric_search_tokenizer = self._init_lyric_search()
+
+    def _migrate(self):
+        # 古いインデックスファイルに後から追加した列を補う
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(albums)')}
+        if 'fingerprint' not in columns:
+            self._conn.execute('ALTER TABLE albums ADD COLUMN fingerprint TEXT')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(tracks)')}
+        if 'crc32' not in columns:
+            self._conn.execute('ALTER TABLE tracks ADD COLUMN crc32 INTEGER')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS tracks_size_crc32 ON tracks (size, crc32)')
+
+    def _init_lyric_search(self) -> str:
+        # FTS5 を組み込んでいない SQLite では歌詞の検索インデックスを使わない
+        row = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lyrics_fts'").fetchone()
+        if row is not None:
+            return next((t for t in _LYRIC_SEARCH_TOKENIZERS if f"'{t}'" in row[0]), _LYRIC_SEARCH_TOKENIZERS[-1])
+        for tokenizer in _LYRIC_SEARCH_TOKENIZERS:
+            try:
+                self._conn.executescript(_LYRIC_SEARCH_SCHEMA.format(tokenizer=tokenizer))
+                self._conn.commit()
+                return tokenizer
+            except sqlite3.OperationalError:
+                self._conn.rollback()
+        return None
+
+    @property
+    def has_lyric_search(self) -> bool:
+        """歌詞の全文検索インデックスを使えるか"""
+        return self.lyric_search_tokenizer is not None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _rel(self, path: str) -> str:
+        try:
+            return os.path.relpath(os.path.abspath(path), self.root)
+        except ValueError:
+            # 別ドライブなど相対パスにできない場合は絶対パスで保存する
+            return os.path.abspath(path)
+
+    def _abs(self, rel_path: str) -> str:
+        return os.path.normpath(os.path.join(self.root, rel_path))
+
+    def _artist_of(self, album_dir: str) -> str:
+        parent = os.path.dirname(os.path.abspath(album_dir))
+        if os.path.normcase(parent) == os.path.normcase(self.root):
+            # シングルはアーティストディレクトリ直下に格納される
+            return os.path.basename(os.path.abspath(album_dir))
+        return os.path.basename(parent)
+
+    # -----------------------------------------------------------------------
+    # 参照
+    # -----------------------------------------------------------------------
+
+    def has_album(self, album_dir: str) -> bool:
+        """アルバムがインデックスに登録されているか"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM albums WHERE path = ?', (self._rel(album_dir),)).fetchone()
+        return row is not None
+
+    def get_album_tracks(self, album_dir: str) -> list[str]:
+        """
+        インデックスに登録されているアルバムのトラックを返す
+        Parameters:
+            album_dir (str): アルバムディレクトリのパス
+        Returns:
+            list[str]: トラックのパスのリスト。アルバムが未登録の場合は None
+        """
+        rel = self._rel(album_dir)
+        with self._lock:
+            if self._conn.execute('SELECT 1 FROM albums WHERE path = ?', (rel,)).fetchone() is None:
+                return None
+            rows = self._conn.execute(
+                'SELECT path FROM tracks WHERE album_path = ? ORDER BY path', (rel,)).fetchall()
+        return [self._abs(p) for p, in rows]
+
+    def get_lyric_file(self, album_dir: str) -> tuple[bool, str]:
+        """
+        アルバムの歌詞ファイルを返す
+        Parameters:
+            album_dir (str): アルバムディレクトリのパス
+        Returns:
+            tuple: (登録済みかどうか, 歌詞ファイルのパス。なければ None)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT lyric_file FROM albums WHERE path = ?', (self._rel(album_dir),)).fetchone()
+        if row is None:
+            return False, None
+        return True, (self._abs(row[0]) if row[0] else None)
+
+    def get_album_fingerprint(self, album_dir: str) -> str:
+        """
+        前回登録時のアルバムのフィンガープリントを返す
+        Parameters:
+            album_dir (str): アルバムディレクトリのパス
+        Returns:
+            str: フィンガープリント。未登録の場合は None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT fingerprint FROM albums WHERE path = ?', (self._rel(album_dir),)).fetchone()
+        return row[0] if row else None
+
+    def get_lyric_albums(self) -> list[str]:
+        """歌詞ファイルが登録されているアルバムのパスを返す"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT path FROM albums WHERE lyric_file IS NOT NULL ORDER BY path').fetchall()
+        return [self._abs(p) for p, in rows]
+
+    def find_identical_track(self, size: int, crc32: int) -> str:
+        """
+        サイズと CRC32 が一致する取り込み済みのトラックを探す
+        登録後に更新されたトラック（サイズ・更新時刻が変わったもの）は対象外とする
+        Parameters:
+            size (int): ファイルサイズ
+            crc32 (int): CRC32
+        Returns:
+            str: 一致したトラックのパス。なければ None
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT path, mtime_ns FROM tracks WHERE size = ? AND crc32 = ?', (size, crc32)).fetchall()
+        for rel_path, mtime_ns in rows:
+            path = self._abs(rel_path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size == size and st.st_mtime_ns == mtime_ns:
+                return path
+        return None
+
+    def search_lyrics(self, phrase: str, limit: int = 20) -> list[tuple[str, str, str, str, str]]:
+        """
+        歌詞またはタイトルに語句を含むトラックを検索する（大文字小文字は区別しない）
+        Parameters:
+            phrase (str): 検索する語句（空白を含めて1つのフレーズとして扱う）
+            limit (int): 返す件数の上限
+        Returns:
+            list[tuple]: (アーティスト, アルバム, タイトル, トラックのパス, 歌詞) のリスト（関連度順）
+        """
+        if not self.has_lyric_search or not phrase.strip():
+            return []
+        if self.lyric_search_tokenizer == 'trigram' and len(phrase) < _TRIGRAM_MIN_CHARS:
+            # 短い語句はインデックスを使えないため全件を走査する
+            pattern = '%' + phrase.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            where, params = "lyrics LIKE ? ESCAPE '\\' OR title LIKE ? ESCAPE '\\'", (pattern, pattern)
+        else:
+            where, params = 'lyrics_fts MATCH ?', ('{title lyrics} : "' + phrase.replace('"', '""') + '"',)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT artist, album, title, lyric_docs.path, lyrics FROM lyrics_fts '
+                'JOIN lyric_docs ON lyric_docs.id = lyrics_fts.rowid '
+                f'WHERE {where} ORDER BY rank LIMIT ?', (*params, limit)).fetchall()
+        return [(artist, album, title, self._abs(path), lyrics) for artist, album, title, path, lyrics in rows]
+
+    # -----------------------------------------------------------------------
+    # 更新
+    # -----------------------------------------------------------------------
+
+    def record_album(self, album_dir: str, audio_files: list[str], lyric_file: str = None,
+                     track_digests: dict[str, tuple[str, bool]] = None, track_crcs: dict[str, int] = None):
+        """
+        アルバムとそのトラックを登録する（既存の登録内容は置き換える）
+        Parameters:
+            album_dir (str): アルバムディレクトリのパス
+            audio_files (list[str | os.DirEntry]): アルバム内のトラックのパス
+            lyric_file (str): 歌詞ファイルのパス。なければ None
+            track_digests (dict): トラックのパス -> (タグダイジェスト, 歌詞の有無)
+            track_crcs (dict): トラックのパス -> CRC32
+        """
+        rel = self._rel(album_dir)
+        artist = self._artist_of(album_dir)
+        rows = [self._track_row(f, rel, track_digests, track_crcs) for f in audio_files]
+        with self._lock, self._conn:
+            # CRC32 が渡されなかったトラックは、変更されていなければ登録済みの値を引き継ぐ
+            known_crcs = {(path, size, mtime_ns): crc32 for path, size, mtime_ns, crc32 in self._conn.execute(
+                'SELECT path, size, mtime_ns, crc32 FROM tracks WHERE album_path = ?', (rel,))}
+            for i, (path, _, size, mtime_ns, digest, has_lyric, crc32) in enumerate(rows):
+                if crc32 is None:
+                    rows[i] = (path, rel, size, mtime_ns, digest, has_lyric,
+                               known_crcs.get((path, size, mtime_ns)))
+            self._conn.execute('DELETE FROM tracks WHERE album_path = ?', (rel,))
+            self._conn.executemany('INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO albums VALUES (?, ?, ?, ?, ?, NULL)',
+                (rel, artist, os.path.basename(album_dir),
+                 self._rel(lyric_file) if lyric_file else None, time.time()))
+            self._refresh_fingerprint(rel)
+
+    def record_track(self, album_dir: str, audio_file: str, lyric_file: str = None,
+                     track_digests: dict[str, tuple[str, bool]] = None, track_crcs: dict[str, int] = None):
+        """
+        アルバム（シングルの場合はアーティストディレクトリ）にトラックを1つ追加登録する
+        Parameters:
+            album_dir (str): トラックを格納するディレクトリのパス
+            audio_file (str): トラックのパス
+            lyric_file (str): 歌詞ファイルのパス。None の場合は変更しない
+            track_digests (dict): トラックのパス -> (タグダイジェスト, 歌詞の有無)
+            track_crcs (dict): トラックのパス -> CRC32
+        """
+        rel = self._rel(album_dir)
+        row = self._track_row(audio_file, rel, track_digests, track_crcs)
+        artist = self._artist_of(album_dir)
+        with self._lock, self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?)', row)
+            self._conn.execute(
+                'INSERT OR IGNORE INTO albums VALUES (?, ?, ?, NULL, ?, NULL)',
+                (rel, artist, os.path.basename(album_dir), time.time()))
+            if lyric_file:
+                self._conn.execute(
+                    'UPDATE albums SET lyric_file = ?, updated_at = ? WHERE path = ?',
+                    (self._rel(lyric_file), time.time(), rel))
+            self._refresh_fingerprint(rel)
+
+    def record_lyrics(self, album_dir: str, track_lyrics: dict[str, tuple[str, str]], whole_album: bool = True):
+        """
+        歌詞ファイルに書いたトラックの歌詞を全文検索インデックスに登録する
+        Parameters:
+            album_dir (str): トラックを格納するディレクトリのパス
+            track_lyrics (dict): トラックのパス -> (タイトル, 歌詞)。歌詞のないトラックは登録しない
+            whole_album (bool): True の場合はアルバムの登録内容を置き換え、False の場合は渡したトラックだけを置き換える
+        """
+        if not self.has_lyric_search:
+            return
+        rel = self._rel(album_dir)
+        artist = self._artist_of(album_dir)
+        album = os.path.basename(os.path.abspath(album_dir))
+        with self._lock, self._conn:
+            if whole_album:
+                self._delete_lyrics('SELECT id FROM lyric_docs WHERE album_path = ?', (rel,))
+            for audio_file, (title, lyrics) in track_lyrics.items():
+                path = self._rel(audio_file)
+                self._delete_lyrics('SELECT id FROM lyric_docs WHERE path = ?', (path,))
+                if not (lyrics and lyrics.strip()):
+                    continue
+                doc_id = self._conn.execute(
+                    'INSERT INTO lyric_docs (path, album_path) VALUES (?, ?)', (path, rel)).lastrowid
+                self._conn.execute('INSERT INTO lyrics_fts (rowid, artist, album, title, lyrics) VALUES (?, ?, ?, ?, ?)',
+                                   (doc_id, artist, album, title, lyrics))
+
+    def forget_album(self, album_dir: str):
+        """アルバムの登録を削除する"""
+        rel = self._rel(album_dir)
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM tracks WHERE album_path = ?', (rel,))
+            self._conn.execute('DELETE FROM albums WHERE path = ?', (rel,))
+            if self.has_lyric_search:
+                self._delete_lyrics('SELECT id FROM lyric_docs WHERE album_path = ?', (rel,))
+
+    def _delete_lyrics(self, id_query: str, params: tuple):
+        # 呼び出し元でロックとトランザクションを確保していること
+        ids = [(doc_id,) for doc_id, in self._conn.execute(id_query, params)]
+        self._conn.executemany('DELETE FROM lyrics_fts WHERE rowid = ?', ids)
+        self._conn.executemany('DELETE FROM lyric_docs WHERE id = ?', ids)
+
+    def _refresh_fingerprint(self, album_rel: str):
+        # 呼び出し元でロックとトランザクションを確保していること
+        rows = self._conn.execute(
+            'SELECT path, size, mtime_ns FROM tracks WHERE album_path = ?', (album_rel,)).fetchall()
+        fingerprint = album_fingerprint(
+            [(os.path.relpath(p, album_rel), size, mtime_ns) for p, size, mtime_ns in rows])
+        self._conn.execute('UPDATE albums SET fingerprint = ? WHERE path = ?', (fingerprint, album_rel))
+
+    def _track_row(self, audio_file: str | os.DirEntry, album_rel: str,
+                   track_digests: dict[str, tuple[str, bool]],
+                   track_crcs: dict[str, int] = None) -> tuple:
+        # 走査時の DirEntry が渡された場合は stat し直さない
+        st = audio_file.stat() if isinstance(audio_file, os.DirEntry) else os.stat(audio_file)
+        digest, has_lyric = (track_digests or {}).get(audio_file, (None, None))
+        return (self._rel(audio_file), album_rel, st.st_size, st.st_mtime_ns,
+                digest, None if has_lyric is None else int(has_lyric),
+                (track_crcs or {}).get(audio_file))
@@ -0,0 +1,400 @@
+"""
+歌詞とタイトルだけを読む軽量なタグリーダー
+
+ID3v2 (USLT/TIT2)・FLAC の Vorbis コメント・MP4 の ©lyr/©nam について、タグの領域だけを読む。
+再生時間の計算やストリーム情報の解析を行わないため、TinyTag.get() より読み取り量が少ない。
+結果は TinyTag で解析した場合と同じになるようにしており、同じにならない可能性がある
+ファイル（ID3v1 にしかタイトルがない MP3・ID3 付きの FLAC・64bit サイズの atom など）や
+対応していない形式では None を返し、呼び出し側で TinyTag に任せる
+"""
+
+import os
+import struct
+from typing import BinaryIO
+
+
+class LyricFields:
+    """
+    歌詞ファイルの作成に使うタグの項目（タイトルと歌詞）
+    """
+
+    __slots__ = ('title', 'lyrics')
+
+    def __init__(self, title: str = None, lyrics: str = None):
+        self.title = title
+        self.lyrics = lyrics
+
+    @classmethod
+    def from_tag(cls, tag) -> 'LyricFields':
+        """
+        TinyTag の解析結果から項目を取り出す（歌詞は lyrics、なければ unsyncedlyrics の最初の値）
+        Parameters:
+            tag (TinyTag): 解析済みのタグ
+        Returns:
+            LyricFields: タイトルと歌詞
+        """
+        lyric_str = None
+        if hasattr(tag, 'other'):
+            if 'lyrics' in tag.other:
+                lyric_str = tag.other['lyrics']
+            elif 'unsyncedlyrics' in tag.other:
+                lyric_str = tag.other['unsyncedlyrics']
+            if isinstance(lyric_str, list):
+                lyric_str = lyric_str[0]
+        return cls(getattr(tag, 'title', None), lyric_str)
+
+
+class _FieldCollector:
+    """TinyTag._set_field() と同じ規則でタイトルと歌詞の候補を集める"""
+
+    def __init__(self):
+        self.title = None
+        # other.lyrics / other.unsyncedlyrics に入る値（先頭が採用される）
+        self.other: dict[str, list[str]] = {}
+
+    def set_title(self, value: str):
+        # 最初の値（NUL 区切りの先頭）がタイトルになり、以降の値は other.title に入る
+        if not self.title:
+            self.title = value.split('\x00')[0]
+
+    def add_other(self, key: str, value: str):
+        if key in ('lyrics', 'unsyncedlyrics'):
+            self.other.setdefault(key, []).append(value)
+
+    def fields(self) -> LyricFields:
+        values = self.other.get('lyrics') or self.other.get('unsyncedlyrics')
+        return LyricFields(self.title, values[0] if values else None)
+
+
+# -----------------------------------------------------------------------
+# ID3v2
+# -----------------------------------------------------------------------
+
+_ID3_HEADER_SIZE = 10
+_ID3_TITLE_FRAMES = {'TIT2', 'TT2'}
+_ID3_LYRIC_FRAMES = {'USLT', 'ULT'}
+_ID3_COMMENT_FRAMES = {'COMM', 'COM'}
+_ID3_CUSTOM_FRAMES = {'TXXX', 'TXX'}
+
+
+def _unsynchsafe(b: bytes) -> int:
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _decode_id3_string(value: bytes, language: bool = False) -> str:
+    """ID3 のテキストフレームを TinyTag と同じ規則でデコードする（先頭 1 バイトがエンコーディング）"""
+    first_byte = value[:1]
+    if first_byte == b'\x00':
+        value = value[1:]
+        encoding = 'ISO-8859-1'
+    elif first_byte == b'\x01':
+        value = value[1:]
+        if language:
+            if value[3:5] in {b'\xfe\xff', b'\xff\xfe'}:
+                value = value[3:]
+            if value[:3].isalpha():
+                value = value[3:]
+            value = value.lstrip(b'\x00')
+        encoding = 'UTF-16be' if value.startswith(b'\xfe\xff') else 'UTF-16le'
+        if value.startswith(b'\xfe\xff') or value.startswith(b'\xff\xfe'):
+            value = value[2:] if len(value) % 2 == 0 else value[2:-1]
+        if value.startswith(b'\x00\x00\xff\xfe'):
+            value = value[4:]
+    elif first_byte == b'\x02':
+        value = value[1:-1] if len(value) % 2 == 0 else value[1:]
+        encoding = 'UTF-16be'
+    elif first_byte == b'\x03':
+        value = value[1:]
+        encoding = 'UTF-8'
+    else:
+        encoding = 'ISO-8859-1'
+    if language and value[:3].isalpha():
+        value = value[3:]
+    return value.decode(encoding, 'replace').strip('\x00')
+
+
+def _add_id3_custom_field(collector: _FieldCollector, content: str):
+    # TXXX や iTunes 形式の COMM は '名前\x00値' の組
+    name, separator, value = content.partition('\x00')
+    value = value.lstrip('\ufeff')
+    if name and separator and value:
+        collector.add_other(name.lower(), value)
+
+
+def _read_id3(fh: BinaryIO) -> LyricFields:
+    header = fh.read(_ID3_HEADER_SIZE)
+    if len(header) < _ID3_HEADER_SIZE or not header.startswith(b'ID3'):
+        return None
+    major = header[3]
+    size = _unsynchsafe(header[6:10])
+    data = bytearray(fh.read(size))
+
+    def ensure(n: int) -> bool:
+        # TinyTag はフレームのヘッダーを読んだサイズに数えないため、パディングのないタグでは
+        # タグ領域の直後も読む。同じ結果にするため、必要になった分だけ追加で読む
+        if len(data) < n:
+            data.extend(fh.read(n - len(data)))
+        return len(data) >= n
+
+    pos = 0
+    if header[5] & 0x40 and ensure(4):
+        # 拡張ヘッダーは読み飛ばす
+        pos = _unsynchsafe(data[:4])
+        if pos > size:
+            return None
+    frame_header_size = 6 if major == 2 else 10
+    id_size = 3 if major == 2 else 4
+    collector = _FieldCollector()
+    parsed_size = 0
+    while parsed_size < size:
+        if not ensure(pos + frame_header_size):
+            break
+        frame_header = data[pos:pos + frame_header_size]
+        frame_id = frame_header[:id_size].decode('ISO-8859-1').strip('\x00')
+        if major == 2:
+            frame_size = int.from_bytes(frame_header[3:6], 'big')
+        elif major == 4:
+            frame_size = _unsynchsafe(frame_header[4:8])
+        else:
+            frame_size = int.from_bytes(frame_header[4:8], 'big')
+        if frame_size == 0 or frame_size > size:
+            break
+        pos += frame_header_size
+        if frame_id in _ID3_TITLE_FRAMES or frame_id in _ID3_LYRIC_FRAMES or frame_id in _ID3_COMMENT_FRAMES:
+            ensure(pos + frame_size)
+            language = frame_id not in _ID3_TITLE_FRAMES
+            value = _decode_id3_string(bytes(data[pos:pos + frame_size]), language)
+            if value:
+                if frame_id in _ID3_TITLE_FRAMES:
+                    collector.set_title(value)
+                elif frame_id in _ID3_LYRIC_FRAMES:
+                    collector.add_other('lyrics', value)
+                else:
+                    _add_id3_custom_field(collector, value)
+        elif frame_id in _ID3_CUSTOM_FRAMES:
+            ensure(pos + frame_size)
+            value = _decode_id3_string(bytes(data[pos:pos + frame_size]))
+            if value:
+                _add_id3_custom_field(collector, value)
+        pos += frame_size
+        parsed_size += frame_size
+
+    if collector.title is None:
+        # タイトルは ID3v1 から補われる可能性がある
+        return None
+    return collector.fields()
+
+
+# -----------------------------------------------------------------------
+# FLAC (Vorbis コメント)
+# -----------------------------------------------------------------------
+
+_FLAC_STREAMINFO = 0
+_FLAC_VORBIS_COMMENT = 4
+
+
+def _parse_vorbis_comment(data: bytes, collector: _FieldCollector):
+    vendor_length = struct.unpack_from('<I', data, 0)[0]
+    pos = 4 + vendor_length
+    count = struct.unpack_from('<I', data, pos)[0]
+    pos += 4
+    for _ in range(count):
+        length = struct.unpack_from('<I', data, pos)[0]
+        pos += 4
+        comment = data[pos:pos + length].decode('utf-8', 'replace')
+        pos += length
+        key, separator, value = comment.partition('=')
+        if not separator or not value:
+            continue
+        key = key.lower()
+        if key == 'title':
+            collector.set_title(value)
+        else:
+            collector.add_other(key, value)
+
+
+def _read_flac(fh: BinaryIO) -> LyricFields:
+    if fh.read(4) != b'fLaC':
+        # ID3 付きの FLAC は ID3 の値が優先されるため TinyTag に任せる
+        return None
+    collector = _FieldCollector()
+    while True:
+        block_header = fh.read(4)
+        if len(block_header) < 4:
+            break
+        block_type = block_header[0] & 0x7f
+        size = int.from_bytes(block_header[1:4], 'big')
+        if block_type == _FLAC_STREAMINFO and size < 34:
+            # TinyTag は不正な STREAMINFO 以降を読まない
+            break
+        if block_type == _FLAC_VORBIS_COMMENT:
+            data = fh.read(size)
+            try:
+                _parse_vorbis_comment(data, collector)
+            except struct.error:
+                return None
+        else:
+            fh.seek(size, os.SEEK_CUR)
+        if block_header[0] & 0x80:
+            break
+    return collector.fields()
+
+
+# -----------------------------------------------------------------------
+# MP4 (moov/udta/meta/ilst)
+# -----------------------------------------------------------------------
+
+_MP4_DATA_TYPE_UTF8 = 1
+_MP4_DATA_TYPE_INTEGER = 21
+_MP4_INTEGER_FORMATS = {1: '>b', 2: '>h', 4: '>i', 8: '>q'}
+
+
+def _mp4_data_value(data: bytes) -> str:
+    data_type = struct.unpack('>I', data[:4])[0]
+    payload = data[8:]
+    if data_type == _MP4_DATA_TYPE_UTF8:
+        return payload.decode('utf-8', 'replace')
+    if data_type == _MP4_DATA_TYPE_INTEGER and len(payload) in _MP4_INTEGER_FORMATS:
+        return str(struct.unpack(_MP4_INTEGER_FORMATS[len(payload)], payload)[0])
+    return None
+
+
+def _parse_mp4_custom_field(data: bytes, collector: _FieldCollector):
+    # iTunes のカスタム項目（name と data の組。値はすべて最後の name の項目になる）
+    name = None
+    values = []
+    pos = 0
+    while pos + 8 <= len(data):
+        size = struct.unpack('>I', data[pos:pos + 4])[0]
+        if size < 8:
+            raise ValueError('invalid atom size')
+        atom_type = data[pos + 4:pos + 8]
+        content = data[pos + 8:pos + size]
+        if atom_type == b'name':
+            name = content[4:].lower().decode('utf-8', 'replace')
+        elif atom_type == b'data' and name:
+            value = _mp4_data_value(content)
+            if value:
+                values.append(value)
+        pos += size
+    if name:
+        for value in values:
+            collector.add_other(name, value)
+
+
+class _Mp4Walker:
+    """
+    TinyTag と同じ順序・同じ位置の進め方で moov/udta/meta/ilst をたどり、©nam/©lyr/---- だけを読む
+    （壊れた atom のサイズに対しても TinyTag と同じ値になるよう、子 atom を読み終えた位置から続きを読む）
+    """
+
+    _TREE = {b'moov': {b'udta': {b'meta': {b'ilst': None}}}}
+    # ilst 内でデータを読む項目（それ以外の項目は data の中身を読まずに飛ばす）
+    _ITEM_FIELDS = {b'\xa9nam': 'title', b'\xa9lyr': 'lyrics'}
+
+    def __init__(self, fh: BinaryIO, collector: _FieldCollector):
+        self.fh = fh
+        self.collector = collector
+        # TinyTag は先頭が ftyp のファイルでだけ、未知の ilst 項目の中の data をたどる
+        self.starts_with_ftyp = False
+
+    def _headers(self, stop_pos: int = None):
+        """atom のヘッダーを順に読み、(種類, データのサイズ) を返す。呼び出し側が読み進めた位置から続ける"""
+        fh = self.fh
+        atom_header = fh.read(8)
+        while len(atom_header) == 8:
+            raw_size = struct.unpack('>I', atom_header[:4])[0]
+            if raw_size in (0, 1):
+                # 64bit サイズ (1) とファイル末尾まで (0) の atom は TinyTag と読み方が揃わないため扱わない
+                raise ValueError(f'unsupported atom size {raw_size}')
+            atom_size = raw_size - 8
+            if atom_size > 0:
+                yield atom_header[4:], atom_size
+                if stop_pos is not None and fh.tell() >= stop_pos:
+                    return
+            atom_header = fh.read(8)
+
+    def walk(self):
+        first = self.fh.read(8)[4:]
+        self.starts_with_ftyp = first == b'ftyp'
+        self.fh.seek(0)
+        self._walk_tree(self._TREE, None)
+
+    def _walk_tree(self, tree: dict, stop_pos: int):
+        fh = self.fh
+        for atom_type, atom_size in self._headers(stop_pos):
+            if atom_type == b'meta':
+                # meta はバージョンとフラグの 4 バイトを持つ（TinyTag はこの 4 バイトを終了位置に含めない）
+                fh.seek(4, os.SEEK_CUR)
+            if atom_type in tree:
+                subtree = tree[atom_type]
+                end_pos = fh.tell() + atom_size
+                if subtree is None:
+                    self._walk_ilst(end_pos)
+                else:
+                    self._walk_tree(subtree, end_pos)
+            else:
+                fh.seek(atom_size, os.SEEK_CUR)
+
+    def _walk_ilst(self, stop_pos: int):
+        fh = self.fh
+        for atom_type, atom_size in self._headers(stop_pos):
+            if atom_type == b'----':
+                _parse_mp4_custom_field(fh.read(atom_size), self.collector)
+            elif atom_type in self._ITEM_FIELDS or self.starts_with_ftyp:
+                self._walk_item(self._ITEM_FIELDS.get(atom_type), fh.tell() + atom_size)
+            else:
+                fh.seek(atom_size, os.SEEK_CUR)
+
+    def _walk_item(self, field: str, stop_pos: int):
+        fh = self.fh
+        for atom_type, atom_size in self._headers(stop_pos):
+            if atom_type != b'data':
+                fh.seek(atom_size, os.SEEK_CUR)
+            elif field is None:
+                # 他の項目の data は TinyTag では解析されるが、ここでは読み飛ばす
+                fh.seek(atom_size, os.SEEK_CUR)
+            else:
+                value = _mp4_data_value(fh.read(atom_size))
+                if not value:
+                    continue
+                if field == 'title':
+                    self.collector.set_title(value)
+                else:
+                    self.collector.add_other('lyrics', value)
+
+
+def _read_mp4(fh: BinaryIO) -> LyricFields:
+    collector = _FieldCollector()
+    try:
+        # moov 以外の atom（mdat など）はヘッダーだけ読んでシークで飛ばすため、moov が末尾にあっても読める
+        _Mp4Walker(fh, collector).walk()
+    except (ValueError, struct.error):
+        return None
+    return collector.fields()
+
+
+_READERS = {
+    '.mp3': _read_id3,
+    '.flac': _read_flac,
+    '.m4a': _read_mp4,
+}
+
+
+def read_lyric_fields(filename: str | os.PathLike, file_obj: BinaryIO = None) -> LyricFields:
+    """
+    タグの領域だけを読んでタイトルと歌詞を取得する
+    Parameters:
+        filename (str | os.PathLike): オーディオファイルのパス（file_obj を指定した場合は拡張子の判定にだけ使う）
+        file_obj (BinaryIO): 読み取り元。None の場合は filename を開く
+    Returns:
+        LyricFields: タイトルと歌詞。この形式に対応していないか、TinyTag と同じ結果にならない可能性がある場合は None
+    """
+    ext = os.path.splitext(os.fspath(filename))[1].lower()
+    reader = _READERS.get(ext)
+    if reader is None:
+        return None
+    if file_obj is not None:
+        return reader(file_obj)
+    with open(filename, 'rb') as fh:
+        return reader(fh)
@@ -0,0 +1,288 @@
+"""
+TinyTag の解析結果（または歌詞とタイトルだけの軽量な解析結果）をファイル単位でキャッシュする
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from tinytag import TinyTag, TinyTagException
+from lyric_reader import LyricFields, read_lyric_fields
+from timing import span
+
+
+DEFAULT_MAX_ENTRIES = 512
+
+
+class TagCache:
+    """
+    パス + サイズ + 更新時刻をキーとする TinyTag 解析結果の LRU キャッシュ
+    get_lyric_fields() で軽量に解析したファイルは LyricFields を保持し、get() で改めて TinyTag で解析する
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # path -> (size, mtime_ns, tag)
+        self._entries: OrderedDict[str, tuple[int, int, TinyTag | LyricFields]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_key(audio_file: str | os.DirEntry) -> str:
+        return os.path.normcase(os.path.abspath(audio_file))
+
+    def _lookup(self, key: str, st: os.stat_result, lyric_only: bool) -> TinyTag | LyricFields:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                size, mtime_ns, tag = entry
+                if size == st.st_size and mtime_ns == st.st_mtime_ns:
+                    if lyric_only or isinstance(tag, TinyTag):
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return tag
+                else:
+                    # 更新されたファイルは解析し直す
+                    del self._entries[key]
+            self.misses += 1
+        return None
+
+    def get(self, audio_file: str | os.DirEntry) -> TinyTag:
+        """
+        オーディオファイルのタグを取得する。ファイルが変更されていなければキャッシュを返す
+        Parameters:
+            audio_file (str | os.DirEntry): オーディオファイルのパス。DirEntry の場合は保持している stat 結果を使う
+        Returns:
+            TinyTag: 解析済みのタグ
+        """
+        key = self._make_key(audio_file)
+        st = audio_file.stat() if isinstance(audio_file, os.DirEntry) else os.stat(audio_file)
+        tag = self._lookup(key, st, lyric_only=False)
+        if tag is not None:
+            return tag
+
+        # 解析はロックの外で行い、他スレッドの読み取りを止めない
+        with span('tag', files=1):
+            tag = TinyTag.get(audio_file)
+        self._store(key, st.st_size, st.st_mtime_ns, tag)
+        return tag
+
+    def get_lyric_fields(self, audio_file: str | os.DirEntry) -> LyricFields:
+        """
+        オーディオファイルのタイトルと歌詞を取得する
+        キャッシュになければタグの領域だけを読む軽量なリーダーで解析し、対応していない形式は TinyTag で解析する
+        Parameters:
+            audio_file (str | os.DirEntry): オーディオファイルのパス。DirEntry の場合は保持している stat 結果を使う
+        Returns:
+            LyricFields: タイトルと歌詞
+        """
+        key = self._make_key(audio_file)
+        st = audio_file.stat() if isinstance(audio_file, os.DirEntry) else os.stat(audio_file)
+        tag = self._lookup(key, st, lyric_only=True)
+        if tag is None:
+            with span('lyric_tag', files=1):
+                tag = read_lyric_fields(audio_file)
+            if tag is None:
+                with span('tag', files=1):
+                    tag = TinyTag.get(audio_file)
+            self._store(key, st.st_size, st.st_mtime_ns, tag)
+        return tag if isinstance(tag, LyricFields) else LyricFields.from_tag(tag)
+
+    def contains(self, audio_file: str, lyric_only: bool = False) -> bool:
+        """
+        ファイルのタグがキャッシュにあるか（統計には数えない）
+        Parameters:
+            audio_file (str): オーディオファイルのパス
+            lyric_only (bool): True の場合は LyricFields だけがあるファイルも含める
+        """
+        with self._lock:
+            entry = self._entries.get(self._make_key(audio_file))
+            return entry is not None and (lyric_only or isinstance(entry[2], TinyTag))
+
+    def put(self, audio_file: str, tag: TinyTag | LyricFields):
+        """
+        別経路で解析済みのタグを登録する（展開中に解析したタグなど）
+        Parameters:
+            audio_file (str): オーディオファイルのパス
+            tag (TinyTag | LyricFields): 解析済みのタグ
+        """
+        st = os.stat(audio_file)
+        self._store(self._make_key(audio_file), st.st_size, st.st_mtime_ns, tag)
+
+    def store(self, audio_file: str, size: int, mtime_ns: int, tag: TinyTag | LyricFields):
+        """
+        キャッシュの外で解析したタグを、解析時のサイズと更新時刻で登録する（ワーカープールでの解析など）
+        キャッシュを経由せずに解析した分として、ミスに数える
+        Parameters:
+            audio_file (str): オーディオファイルのパス
+            size (int): 解析時のファイルサイズ
+            mtime_ns (int): 解析時の更新時刻 [ns]
+            tag (TinyTag | LyricFields): 解析済みのタグ
+        """
+        with self._lock:
+            self.misses += 1
+        self._store(self._make_key(audio_file), size, mtime_ns, tag)
+
+    def _store(self, key: str, size: int, mtime_ns: int, tag: TinyTag | LyricFields):
+        with self._lock:
+            self._entries[key] = (size, mtime_ns, tag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats_str(self) -> str:
+        """
+        ヒット/ミス数を表示用の文字列にする
+        """
+        return (f'tag cache: hits={self.hits}, misses={self.misses}, '
+                f'evictions={self.evictions}, entries={len(self._entries)}')
+
+
+_default_cache = TagCache()
+
+
+def get_tag_cache() -> TagCache:
+    """実行全体で共有するタグキャッシュを返す"""
+    return _default_cache
+
+
+def get_tag(audio_file: str | os.DirEntry) -> TinyTag:
+    """
+    共有キャッシュ経由でオーディオファイルのタグを取得
+    Parameters:
+        audio_file (str | os.DirEntry): オーディオファイルのパス
+    Returns:
+        TinyTag: 解析済みのタグ
+    """
+    return _default_cache.get(audio_file)
+
+
+def get_lyric_fields(audio_file: str | os.DirEntry) -> LyricFields:
+    """
+    共有キャッシュ経由でオーディオファイルのタイトルと歌詞を取得
+    Parameters:
+        audio_file (str | os.DirEntry): オーディオファイルのパス
+    Returns:
+        LyricFields: タイトルと歌詞
+    """
+    return _default_cache.get_lyric_fields(audio_file)
+
+
+def _read_tag_for_pool(audio_file: str, lyric_only: bool = False) -> tuple[int, int, TinyTag | LyricFields]:
+    """
+    プロセスプールのワーカーでタグを解析する
+    Parameters:
+        audio_file (str): オーディオファイルのパス
+        lyric_only (bool): True の場合は可能であれば軽量なリーダーでタイトルと歌詞だけを解析する
+    Returns:
+        tuple: (サイズ, 更新時刻 [ns], タグ)。解析できない場合は None
+    """
+    try:
+        st = os.stat(audio_file)
+        tag = read_lyric_fields(audio_file) if lyric_only else None
+        if tag is None:
+            tag = TinyTag.get(audio_file)
+            # 閉じたファイルオブジェクトはプロセス間で受け渡せない
+            tag._filehandler = None
+    except (OSError, TinyTagException):
+        return None
+    return st.st_size, st.st_mtime_ns, tag
+
+
+class TagReaderPool:
+    """
+    複数トラックのタグをスレッドまたはプロセスのプールでまとめて解析し、キャッシュに格納する
+    """
+
+    def __init__(self, workers: int, use_processes: bool = False):
+        self.workers = workers
+        self.use_processes = use_processes
+        self._executor: Executor = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def prefetch(self, audio_files: list[str], cache: TagCache, lyric_only: bool = False):
+        """
+        キャッシュにないトラックのタグを並列に解析してキャッシュに格納する
+        解析できないファイルはスキップし、後で通常どおり読み直したときにエラーとする
+        Parameters:
+            audio_files (list[str]): オーディオファイルのパスのリスト
+            cache (TagCache): 格納先のキャッシュ
+            lyric_only (bool): True の場合はタイトルと歌詞だけを解析する（TagCache.get_lyric_fields() と同じ）
+        """
+        targets = [f for f in audio_files if not cache.contains(f, lyric_only)]
+        if len(targets) < 2:
+            return
+        executor = self._get_executor()
+        if self.use_processes:
+            # DirEntry はプロセス間で受け渡せないためパスにする
+            targets = [os.fspath(f) for f in targets]
+            chunksize = max(1, len(targets) // (self.workers * 4))
+            with span('tag_prefetch', files=len(targets)):
+                results = executor.map(_read_tag_for_pool, targets, [lyric_only] * len(targets), chunksize=chunksize)
+                for audio_file, result in zip(targets, results):
+                    if result is not None:
+                        size, mtime_ns, tag = result
+                        cache.store(audio_file, size, mtime_ns, tag)
+        else:
+            read_tag = cache.get_lyric_fields if lyric_only else cache.get
+
+            def read(audio_file: str):
+                try:
+                    read_tag(audio_file)
+                except (OSError, TinyTagException):
+                    pass
+            with span('tag_prefetch', files=len(targets)):
+                list(executor.map(read, targets))
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_pool: TagReaderPool = None
+
+
+def configure_tag_pool(workers: int, use_processes: bool = False):
+    """
+    タグ解析に使うワーカープールを設定する。workers が 1 以下の場合は逐次解析に戻す
+    Parameters:
+        workers (int): ワーカー数
+        use_processes (bool): True の場合はプロセスプール、False の場合はスレッドプールを使う
+    """
+    global _pool
+    shutdown_tag_pool()
+    if workers > 1:
+        _pool = TagReaderPool(workers, use_processes)
+
+
+def shutdown_tag_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def prefetch_tags(audio_files: list[str], lyric_only: bool = False):
+    """
+    設定されたワーカープールで共有キャッシュにタグを先読みする。プール未設定の場合は何もしない
+    Parameters:
+        audio_files (list[str]): オーディオファイルのパスのリスト
+        lyric_only (bool): True の場合はタイトルと歌詞だけを解析する
+    """
+    if _pool is not None:
+        _pool.prefetch(audio_files, _default_cache, lyric_only)
@@ -0,0 +1,167 @@
+"""
+処理の区間ごとの所要時間・バイト数・ファイル数を記録する
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class SpanStats:
+    """
+    区間名ごとの呼び出し回数・所要時間・バイト数・ファイル数の集計
+    """
+
+    def __init__(self):
+        # name -> [count, seconds, bytes, files]
+        self._spans: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, nbytes: int = 0, files: int = 0):
+        with self._lock:
+            entry = self._spans.get(name)
+            if entry is None:
+                entry = self._spans[name] = [0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += nbytes
+            entry[3] += files
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {name: {'count': count, 'seconds': round(seconds, 6), 'bytes': nbytes, 'files': files}
+                    for name, (count, seconds, nbytes, files) in self._spans.items()}
+
+
+class ItemTimings:
+    """
+    1つの zip ファイルまたはシングルの処理に含まれる区間の集計
+    """
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.status = None
+        self.spans = SpanStats()
+        self._start = time.perf_counter()
+        self.wall_seconds = None
+
+    def finish(self, status: str):
+        self.status = status
+        self.wall_seconds = time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        return {'kind': self.kind, 'name': self.name, 'status': self.status,
+                'wall_seconds': None if self.wall_seconds is None else round(self.wall_seconds, 6),
+                'spans': self.spans.to_dict()}
+
+
+class Span:
+    """span() の中で処理したバイト数・ファイル数を後から設定するための記録"""
+
+    __slots__ = ('nbytes', 'files')
+
+    def __init__(self, nbytes: int, files: int):
+        self.nbytes = nbytes
+        self.files = files
+
+
+_total = SpanStats()
+_items: list[ItemTimings] = []
+_items_lock = threading.Lock()
+_run_start = time.perf_counter()
+# 現在のスレッドで処理中の zip ファイル/シングル
+_current = threading.local()
+
+
+@contextmanager
+def span(name: str, nbytes: int = 0, files: int = 0):
+    """
+    with ブロックの所要時間を区間 name として全体と処理中の項目に記録する
+    区間は入れ子にできる（展開中のタグ解析など）ため、区間ごとの時間の合計は実時間と一致しない
+    Parameters:
+        name (str): 区間名
+        nbytes (int): 処理したバイト数（with ブロック内で Span.nbytes に設定してもよい）
+        files (int): 処理したファイル数（with ブロック内で Span.files に設定してもよい）
+    """
+    record = Span(nbytes, files)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        _total.add(name, elapsed, record.nbytes, record.files)
+        item = getattr(_current, 'item', None)
+        if item is not None:
+            item.spans.add(name, elapsed, record.nbytes, record.files)
+
+
+def new_item(kind: str, name: str) -> ItemTimings:
+    """
+    集計対象の項目（zip ファイルまたはシングル）を登録する
+    Parameters:
+        kind (str): 'zip' または 'single'
+        name (str): ファイル名
+    Returns:
+        ItemTimings: 登録した項目
+    """
+    item = ItemTimings(kind, name)
+    with _items_lock:
+        _items.append(item)
+    return item
+
+
+@contextmanager
+def item_scope(item: ItemTimings):
+    """with ブロック内で記録した区間を item にも集計する（ワーカースレッドごとに設定する）"""
+    previous = getattr(_current, 'item', None)
+    _current.item = item
+    try:
+        yield item
+    finally:
+        _current.item = previous
+
+
+def report() -> dict:
+    """全体と項目ごとの集計を JSON に変換できる辞書にする"""
+    with _items_lock:
+        items = [item.to_dict() for item in _items]
+    return {
+        'total': {'wall_seconds': round(time.perf_counter() - _run_start, 6), 'spans': _total.to_dict()},
+        'items': items,
+    }
+
+
+def write_report(path: str):
+    """
+    集計を JSON で書き出す
+    Parameters:
+        path (str): 出力先のパス。'-' の場合は標準出力
+    """
+    text = json.dumps(report(), ensure_ascii=False, indent=2)
+    if path == '-':
+        print(text)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+def summary_str() -> str:
+    """全体の集計を1行の文字列にする"""
+    spans = _total.to_dict()
+    parts = [f"{name}={s['seconds']:.3f}s/{s['count']}" for name, s in spans.items()]
+    return f'timings: wall={time.perf_counter() - _run_start:.3f}s' + (', ' + ', '.join(parts) if parts else '')
+
+
+def format_throughput(nbytes: int, seconds: float) -> str:
+    """
+    転送量と転送速度を 'x.x MB, y.y MB/s' の形の文字列にする
+    Parameters:
+        nbytes (int): バイト数
+        seconds (float): 所要時間（0 の場合、速度は inf になる）
+    Returns:
+        str: 転送量と転送速度
+    """
+    rate = nbytes / seconds / (1024 * 1024) if seconds > 0 else float('inf')
+    return f'{nbytes / (1024 * 1024):.1f} MB, {rate:.1f} MB/s'
@@ -0,0 +1,167 @@
+"""
+ファイルの移動（同一ボリュームでは rename、別ボリュームではカーネル内コピー + サイズの確認）
+"""
+
+import errno
+import os
+import shutil
+import sys
+import time
+
+from timing import Span, format_throughput, span
+
+
+# 別ボリュームへコピーするときの 1 回あたりの転送サイズ
+TRANSFER_CHUNK_SIZE = 8 * 1024 * 1024
+
+METHOD_RENAME = 'rename'
+METHOD_COPY_FILE_RANGE = 'copy_file_range'
+METHOD_SENDFILE = 'sendfile'
+METHOD_BUFFERED = 'buffered copy'
+
+
+class TransferResult:
+    """
+    move_file() の結果（移動先・使った方法・転送量・所要時間）
+    """
+
+    def __init__(self, dst: str, method: str, nbytes: int, seconds: float):
+        self.dst = dst
+        self.method = method
+        self.nbytes = nbytes
+        self.seconds = seconds
+
+    @property
+    def copied(self) -> bool:
+        """データのコピーが発生したか"""
+        return self.method != METHOD_RENAME
+
+    def __str__(self) -> str:
+        if not self.copied:
+            return self.method
+        return f'{self.method}, size checked, {format_throughput(self.nbytes, self.seconds)}'
+
+
+def _is_same_device(src: str, dst_dir: str) -> bool:
+    try:
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+
+# 各コピー関数はコピーしたバイト数を返す
+
+def _copy_with_copy_file_range(fsrc, fdst, size: int) -> int:
+    offset = 0
+    while offset < size:
+        n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(TRANSFER_CHUNK_SIZE, size - offset))
+        if n == 0:
+            break
+        offset += n
+    return offset
+
+
+def _copy_with_sendfile(fsrc, fdst, size: int) -> int:
+    offset = 0
+    while offset < size:
+        n = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, min(TRANSFER_CHUNK_SIZE, size - offset))
+        if n == 0:
+            break
+        offset += n
+    return offset
+
+
+def _copy_buffered(fsrc, fdst, size: int) -> int:
+    buf = bytearray(TRANSFER_CHUNK_SIZE)
+    view = memoryview(buf)
+    copied = 0
+    while True:
+        n = fsrc.readinto(buf)
+        if not n:
+            break
+        fdst.write(view[:n])
+        copied += n
+    return copied
+
+
+# 使える方法から順に試す（copy_file_range/sendfile はファイルシステムによっては使えない）
+_COPY_METHODS = []
+if hasattr(os, 'copy_file_range'):
+    _COPY_METHODS.append((METHOD_COPY_FILE_RANGE, _copy_with_copy_file_range))
+if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+    # macOS などの sendfile はソケットにしか書けない
+    _COPY_METHODS.append((METHOD_SENDFILE, _copy_with_sendfile))
+_COPY_METHODS.append((METHOD_BUFFERED, _copy_buffered))
+
+# カーネル内コピーがこのファイルの組み合わせでは使えないことを表す errno（通常のコピーに切り替える）
+UNSUPPORTED_COPY_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def copy_file(src: str, dst: str) -> str:
+    """
+    ファイルをカーネル内コピーで複製し、コピー先のサイズがコピー元と同じかを確認する（内容は比較しない）
+    copy_file_range/sendfile が使えない場合や途中で 0 バイトを返した場合は、次の方法でやり直す
+    Parameters:
+        src (str): コピー元のパス
+        dst (str): コピー先のパス
+    Returns:
+        str: 使ったコピー方法
+    """
+    size = os.path.getsize(src)
+    for method, copy_func in _COPY_METHODS:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                copied = copy_func(fsrc, fdst, size)
+            except OSError as e:
+                if e.errno in UNSUPPORTED_COPY_ERRNOS and method != METHOD_BUFFERED:
+                    # この方法が使えないファイルシステムなので次の方法でやり直す
+                    continue
+                raise
+        if copied < size and method != METHOD_BUFFERED:
+            # FUSE や procfs のようなファイルでは、途中で 0 バイトを返すことがある
+            continue
+        break
+
+    copied_size = os.path.getsize(dst)
+    if copied_size != size:
+        os.remove(dst)
+        raise OSError(f'size check failed for the copy of {src} ({copied_size} of {size} bytes)')
+    shutil.copystat(src, dst)
+    return method
+
+
+def move_file(src: str, dst: str) -> TransferResult:
+    """
+    ファイルを移動する。同一ボリュームでは rename し、別ボリュームではコピーしてサイズを確認してから元を削除する
+    shutil.move() と同じく、dst がディレクトリの場合はその中へ移動し、移動先が既にあればエラーとする
+    Parameters:
+        src (str): 移動するファイルのパス
+        dst (str): 移動先のパスまたはディレクトリ
+    Returns:
+        TransferResult: 移動の結果
+    """
+    real_dst = dst
+    if os.path.isdir(dst):
+        real_dst = os.path.join(dst, os.path.basename(src.rstrip(os.sep)))
+        if os.path.exists(real_dst):
+            raise shutil.Error(f"Destination path '{real_dst}' already exists")
+
+    with span('move', files=1) as sp:
+        return _move_file(src, real_dst, sp)
+
+
+def _move_file(src: str, real_dst: str, sp: Span) -> TransferResult:
+    start = time.perf_counter()
+    if _is_same_device(src, os.path.dirname(os.path.abspath(real_dst))):
+        try:
+            os.replace(src, real_dst)
+            return TransferResult(real_dst, METHOD_RENAME, 0, time.perf_counter() - start)
+        except OSError as e:
+            # バインドマウントをまたぐ場合など、同じデバイスでも rename できないことがある
+            if e.errno != errno.EXDEV:
+                raise
+
+    nbytes = sp.nbytes = os.path.getsize(src)
+    method = copy_file(src, real_dst)
+    os.remove(src)
+    return TransferResult(real_dst, method, nbytes, time.perf_counter() - start)
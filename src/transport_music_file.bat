@@ -28,8 +28,11 @@ echo %SCRIPT_NAME% : Activated "%MY_VENV_NAME%"
 :::::::::::::::::::::::::::::::::::::::::::::::
 
 set PY_SCRIPT_NAME=extract_music_zip.py
+:: utransport_music_file.bat watchvŋNƁA_E[h̊҂ďiCtrl+C ŏIj
+set PY_ARGS=
+if /i "%~1"=="watch" set PY_ARGS=--watch
 
-python %PY_SCRIPT_NAME%
+python %PY_SCRIPT_NAME% %PY_ARGS%
 
 if %errorlevel% neq 0 (
 echo %SCRIPT_NAME% : pythonXNvgsG[i%MY_VENV_NAME%j
@@ -0,0 +1,112 @@
+"""
+zip アーカイブ内のオーディオファイルのタグを、展開せずに読む
+
+無圧縮 (STORED) のメンバーはアーカイブ上のデータ範囲を直接読むため、シークが安く、タグの領域だけを読む。
+圧縮されたメンバーは ZipFile.open() のストリームから読む（後方へのシークは先頭から展開し直しになる）
+"""
+
+import io
+import os
+import struct
+import zipfile
+from typing import BinaryIO
+
+from tinytag import TinyTag
+from lyric_reader import LyricFields, read_lyric_fields
+from timing import span
+
+
+def member_data_offset(zip_fd: int, info: zipfile.ZipInfo) -> int:
+    """ローカルファイルヘッダーを読み、メンバーのデータの開始位置を返す"""
+    header = os.pread(zip_fd, zipfile.sizeFileHeader, info.header_offset)
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f'Bad magic number for file header: {info.filename}')
+    filename_length, extra_length = fields[10], fields[11]
+    return info.header_offset + zipfile.sizeFileHeader + filename_length + extra_length
+
+
+class _StoredMemberReader(io.RawIOBase):
+    """無圧縮メンバーのデータ範囲を pread で読むリーダー（アーカイブのファイル位置は動かさない）"""
+
+    def __init__(self, zip_fd: int, offset: int, size: int):
+        self._fd = zip_fd
+        self._offset = offset
+        self._size = size
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def readinto(self, b):
+        view = memoryview(b).cast('B')
+        n = max(0, min(len(view), self._size - self._pos))
+        if n == 0:
+            return 0
+        data = os.pread(self._fd, n, self._offset + self._pos)
+        view[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def open_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> BinaryIO:
+    """
+    メンバーを展開せずに読むための、シークできるファイルオブジェクトを返す
+    Parameters:
+        zf (zipfile.ZipFile): パスから開いた zip ファイル
+        info (zipfile.ZipInfo): 読むメンバー
+    Returns:
+        BinaryIO: メンバーの内容を読むファイルオブジェクト
+    """
+    if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1 and hasattr(os, 'pread'):
+        zip_fd = zf.fp.fileno()
+        return io.BufferedReader(_StoredMemberReader(zip_fd, member_data_offset(zip_fd, info), info.file_size))
+    return zf.open(info)
+
+
+def read_member_lyric_fields(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> LyricFields:
+    """
+    メンバーのタイトルと歌詞を取得する。軽量なリーダーで読めない形式は TinyTag で解析する
+    Parameters:
+        zf (zipfile.ZipFile): パスから開いた zip ファイル
+        info (zipfile.ZipInfo): 読むメンバー
+    Returns:
+        LyricFields: タイトルと歌詞
+    """
+    with open_member(zf, info) as fh:
+        with span('lyric_tag', files=1):
+            fields = read_lyric_fields(info.filename, fh)
+        if fields is not None:
+            return fields
+        fh.seek(0)
+        with span('tag', files=1):
+            return LyricFields.from_tag(TinyTag.get(filename=info.filename, file_obj=fh))
+
+
+def read_member_tag(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> TinyTag:
+    """
+    メンバーのタグを TinyTag で解析する
+    Parameters:
+        zf (zipfile.ZipFile): パスから開いた zip ファイル
+        info (zipfile.ZipInfo): 読むメンバー
+    Returns:
+        TinyTag: 解析済みのタグ
+    """
+    with open_member(zf, info) as fh, span('tag', files=1):
+        tag = TinyTag.get(filename=info.filename, file_obj=fh)
+    tag._filehandler = None
+    return tag
@@ -3,10 +3,16 @@ m4aファイルのタグ編集ができない原因を診断するツール
 """
 
 import argparse
+import contextlib
+import glob
+import json
+import mmap
 import os
 import stat
 import struct
 import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 
 # ---------------------------------------------------------------------------
@@ -36,6 +42,202 @@ class DiagnosticResult:
         label = f'[{self.status:<4}]'
         return f'{c}{label}{reset} {self.title}: {self.detail}'
 
+    def to_dict(self) -> dict:
+        return {'status': self.status, 'title': self.title, 'detail': self.detail}
+
+
+# ---------------------------------------------------------------------------
+# MP4 アトム解析
+# ---------------------------------------------------------------------------
+
+# 子アトムを持つコンテナアトム
+_CONTAINER_ATOMS = {
+    'moov', 'trak', 'mdia', 'minf', 'stbl', 'udta', 'edts', 'dinf',
+    'mvex', 'moof', 'traf', 'ilst', 'meta',
+}
+
+# 暗号化されたサンプルエントリの種類
+_PROTECTED_SAMPLE_ENTRIES = {'drms', 'drmi', 'enca', 'encv'}
+
+# サウンドサンプル記述のバージョンごとの、サンプルエントリ先頭から子アトムまでのバイト数
+_SOUND_ENTRY_CHILD_OFFSETS = {0: 36, 1: 52, 2: 72}
+
+# パディングとして扱うアトム
+_PADDING_ATOMS = {'free', 'skip'}
+
+
+class Mp4Atom:
+    """アトムツリーの1ノード（位置情報のみ保持し、中身はコピーしない）"""
+
+    __slots__ = ('name', 'offset', 'size', 'header_size', 'children')
+
+    def __init__(self, name: str, offset: int, size: int, header_size: int):
+        self.name = name
+        self.offset = offset
+        self.size = size
+        self.header_size = header_size
+        self.children: list['Mp4Atom'] = []
+
+    @property
+    def data_offset(self) -> int:
+        return self.offset + self.header_size
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+    def find(self, *path: str) -> list['Mp4Atom']:
+        """子孫から path に一致するアトムをすべて返す"""
+        return _find_atoms(self.children, path)
+
+
+@contextlib.contextmanager
+def _map_file(filepath: str):
+    """ファイルを読み取り専用でメモリマップする（空ファイルは空のバイト列）"""
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _iter_atoms(buf, start: int, end: int):
+    """
+    バッファ中の [start, end) の範囲にあるアトムを順に列挙する（ヘッダーのみ参照する）
+    Yields:
+        (offset, name, size, header_size)
+    """
+    end = min(end, len(buf))
+    offset = start
+    while offset + 8 <= end:
+        size, = struct.unpack_from('>I', buf, offset)
+        name = bytes(buf[offset + 4:offset + 8]).decode('latin-1', errors='replace')
+        header_size = 8
+        if size == 1:
+            # 64bit拡張サイズ
+            if offset + 16 > end:
+                break
+            size, = struct.unpack_from('>Q', buf, offset + 8)
+            header_size = 16
+        elif size == 0:
+            # 範囲の末尾まで
+            size = end - offset
+        if size < header_size:
+            break
+        yield offset, name, size, header_size
+        offset += size
+
+
+def _meta_children_start(buf, atom: Mp4Atom) -> int:
+    """meta アトムの子アトムの開始位置を返す
+
+    ISO 形式の meta はフルボックス (version/flags 4 バイト) だが、
+    QuickTime 形式ではヘッダー直後から子アトムが始まる
+    """
+    start = atom.data_offset
+    if start + 8 <= atom.end and bytes(buf[start + 4:start + 8]) in (b'hdlr', b'ilst', b'keys'):
+        return start
+    return start + 4
+
+
+def _parse_atom_tree(buf, start: int, end: int, parent: str = '') -> list[Mp4Atom]:
+    """
+    [start, end) の範囲のアトムを再帰的に解析してツリーにする
+    Returns:
+        list[Mp4Atom]: 範囲直下のアトム
+    """
+    atoms = []
+    for offset, name, size, header_size in _iter_atoms(buf, start, end):
+        atom = Mp4Atom(name, offset, size, header_size)
+        atoms.append(atom)
+        if name == 'meta':
+            atom.children = _parse_atom_tree(buf, _meta_children_start(buf, atom), atom.end, name)
+        elif name in _CONTAINER_ATOMS or parent == 'ilst':
+            # ilst の各項目 (©nam, ©lyr など) は data アトムを子に持つ
+            atom.children = _parse_atom_tree(buf, atom.data_offset, atom.end, name)
+    return atoms
+
+
+def _find_atoms(atoms: list[Mp4Atom], path: tuple[str, ...]) -> list[Mp4Atom]:
+    found = []
+    for atom in atoms:
+        if atom.name != path[0]:
+            continue
+        if len(path) == 1:
+            found.append(atom)
+        else:
+            found += _find_atoms(atom.children, path[1:])
+    return found
+
+
+def _iter_tree(atoms: list[Mp4Atom]):
+    """ツリーのすべてのアトムを深さ優先で列挙する"""
+    for atom in atoms:
+        yield atom
+        yield from _iter_tree(atom.children)
+
+
+def read_mp4_tree(buf) -> list[Mp4Atom]:
+    """
+    メモリマップしたファイル全体のアトムツリーを解析する
+    Parameters:
+        buf: _map_file() で得たバッファ
+    Returns:
+        list[Mp4Atom]: トップレベルのアトム
+    """
+    return _parse_atom_tree(buf, 0, len(buf))
+
+
+def _read_mp4_atoms(filepath: str) -> list[tuple[int, str, int]]:
+    """
+    MP4/M4Aファイルのトップレベルアトムを列挙する
+    Returns:
+        list of (offset, name, size)
+    """
+    with _map_file(filepath) as buf:
+        return [(offset, name, size) for offset, name, size, _ in _iter_atoms(buf, 0, len(buf))]
+
+
+def _ilst_item_text(buf, item: Mp4Atom) -> str:
+    """
+    ilst の項目 (©nam, ©lyr など) の最初の data アトムの値を UTF-8 として返す
+    値はバッファの memoryview のスライスから直接デコードする（bytes にコピーしない）
+    Returns:
+        str: 値。data アトムがない場合は None
+    """
+    for data in item.children:
+        if data.name == 'data':
+            # data アトム: type (4) + locale (4) の後に値が続く
+            with memoryview(buf) as view, view[data.data_offset + 8:data.end] as value:
+                return str(value, 'utf-8', errors='replace')
+    return None
+
+
+def _find_protected_sample_entries(filepath: str) -> tuple[int, list[str]]:
+    """
+    moov/trak/mdia/minf/stbl/stsd をたどり、DRM 保護されたサンプルエントリを探す
+    ファイルをメモリマップしてアトムヘッダーだけを参照するため、ファイル全体を読み込まない
+    Returns:
+        tuple: (見つかった stsd アトムの数, 保護されたサンプルエントリの説明のリスト)
+    """
+    protected = []
+    with _map_file(filepath) as buf:
+        stsd_atoms = _find_atoms(read_mp4_tree(buf), ('moov', 'trak', 'mdia', 'minf', 'stbl', 'stsd'))
+        for stsd in stsd_atoms:
+            # stsd はフルボックス: version/flags (4) + entry_count (4)
+            for entry_offset, entry_name, entry_size, _ in _iter_atoms(buf, stsd.data_offset + 8, stsd.end):
+                if entry_name in _PROTECTED_SAMPLE_ENTRIES:
+                    protected.append(f'サンプルエントリ {entry_name}')
+                version = 0
+                if entry_offset + 18 <= len(buf):
+                    version, = struct.unpack_from('>H', buf, entry_offset + 16)
+                child_start = entry_offset + _SOUND_ENTRY_CHILD_OFFSETS.get(version, 36)
+                for _, child_name, _, _ in _iter_atoms(buf, child_start, entry_offset + entry_size):
+                    if child_name == 'sinf':
+                        protected.append(f'{entry_name}/sinf')
+    return len(stsd_atoms), protected
+
 
 # ---------------------------------------------------------------------------
 # 診断チェック関数
@@ -94,39 +296,6 @@ def check_file_lock(filepath: str) -> DiagnosticResult:
         return DiagnosticResult(DiagnosticResult.WARN, 'ファイルロック', f'確認失敗: {e}')
 
 
-def _read_mp4_atoms(filepath: str) -> list[tuple[int, str, int]]:
-    """
-    MP4/M4Aファイルのトップレベルアトムを列挙する
-    Returns:
-        list of (offset, name, size)
-    """
-    atoms = []
-    with open(filepath, 'rb') as f:
-        file_size = os.path.getsize(filepath)
-        offset = 0
-        while offset < file_size:
-            f.seek(offset)
-            header = f.read(8)
-            if len(header) < 8:
-                break
-            size = struct.unpack('>I', header[:4])[0]
-            name = header[4:8].decode('latin-1', errors='replace')
-            if size == 1:
-                # 64bit拡張サイズ
-                ext = f.read(8)
-                if len(ext) < 8:
-                    break
-                size = struct.unpack('>Q', ext)[0]
-            elif size == 0:
-                # ファイル末尾まで
-                size = file_size - offset
-            if size < 8:
-                break
-            atoms.append((offset, name, size))
-            offset += size
-    return atoms
-
-
 def check_mp4_atoms(filepath: str) -> list[DiagnosticResult]:
     """MP4アトム構造を確認"""
     results = []
@@ -164,16 +333,71 @@ def check_mp4_atoms(filepath: str) -> list[DiagnosticResult]:
     return results
 
 
+def check_mp4_tag_layout(filepath: str) -> list[DiagnosticResult]:
+    """タグ (ilst) の配置・項目・歌詞アトムのサイズ・パディングを確認（mutagen 不要）"""
+    results = []
+    try:
+        with _map_file(filepath) as buf:
+            tree = read_mp4_tree(buf)
+            ilst_list = _find_atoms(tree, ('moov', 'udta', 'meta', 'ilst'))
+            if not ilst_list:
+                results.append(DiagnosticResult(
+                    DiagnosticResult.WARN, 'タグ配置',
+                    'moov/udta/meta/ilst なし — タグが存在しない（書き込み時に新規作成が必要）'
+                ))
+            else:
+                ilst = ilst_list[0]
+                results.append(DiagnosticResult(
+                    DiagnosticResult.INFO, 'タグ配置',
+                    f'moov/udta/meta/ilst (offset {ilst.offset:,}, {ilst.size:,} bytes, {len(ilst.children)} 項目)'
+                ))
+                item_names = [item.name for item in ilst.children]
+                item_summary = ', '.join(item_names[:15]) + ('...' if len(item_names) > 15 else '')
+                results.append(DiagnosticResult(DiagnosticResult.INFO, 'タグ項目', item_summary or '(なし)'))
+
+                title_items = [item for item in ilst.children if item.name == '\xa9nam']
+                title = _ilst_item_text(buf, title_items[0]) if title_items else None
+                results.append(DiagnosticResult(
+                    DiagnosticResult.INFO, 'タイトル', title if title is not None else '\xa9nam なし'))
+
+                lyric_items = [item for item in ilst.children if item.name == '\xa9lyr']
+                if lyric_items:
+                    lyr = lyric_items[0]
+                    data_size = sum(d.size - d.header_size - 8 for d in lyr.children if d.name == 'data')
+                    lyrics = _ilst_item_text(buf, lyr) or ''
+                    first_line = next((line for line in lyrics.splitlines() if line.strip()), '')
+                    results.append(DiagnosticResult(
+                        DiagnosticResult.INFO, '歌詞アトム',
+                        f'\xa9lyr {lyr.size:,} bytes (歌詞データ {data_size:,} bytes, '
+                        f'{len(lyrics.splitlines())} 行, 先頭: "{first_line[:40]}")'
+                    ))
+                else:
+                    results.append(DiagnosticResult(DiagnosticResult.INFO, '歌詞アトム', '\xa9lyr なし'))
+
+            # パディング (free/skip) — moov 内にあればタグ更新時にファイル全体を書き直さずに済む
+            moov_list = _find_atoms(tree, ('moov',))
+            moov_padding = sum(a.size for m in moov_list for a in _iter_tree(m.children) if a.name in _PADDING_ATOMS)
+            top_padding = sum(a.size for a in tree if a.name in _PADDING_ATOMS)
+            results.append(DiagnosticResult(
+                DiagnosticResult.INFO, 'パディング',
+                f'moov 内 {moov_padding:,} bytes, トップレベル {top_padding:,} bytes'
+            ))
+    except Exception as e:
+        results.append(DiagnosticResult(DiagnosticResult.WARN, 'MP4 タグ配置解析', f'失敗: {e}'))
+    return results
+
+
 def check_drm(filepath: str) -> DiagnosticResult:
-    """DRM 保護がかかっていないか確認（drms / sinf アトムの有無）"""
+    """DRM 保護がかかっていないか確認（サンプルエントリ drms / sinf アトムの有無）"""
     try:
-        with open(filepath, 'rb') as f:
-            content = f.read()
-        if b'drms' in content or b'sinf' in content:
+        n_stsd, protected = _find_protected_sample_entries(filepath)
+        if protected:
             return DiagnosticResult(
                 DiagnosticResult.NG, 'DRM',
-                'DRM 関連アトム (drms/sinf) を検出 — DRM 保護ファイルはタグ編集不可'
+                f'DRM 関連アトム ({", ".join(protected)}) を検出 — DRM 保護ファイルはタグ編集不可'
             )
+        if n_stsd == 0:
+            return DiagnosticResult(DiagnosticResult.WARN, 'DRM', 'stsd アトムが見つからないため確認できない')
         return DiagnosticResult(DiagnosticResult.OK, 'DRM', 'DRM アトムなし')
     except Exception as e:
         return DiagnosticResult(DiagnosticResult.WARN, 'DRM', f'確認失敗: {e}')
@@ -289,25 +513,22 @@ def check_mutagen_write(filepath: str, dry_run: bool = True) -> DiagnosticResult
 # メイン診断処理
 # ---------------------------------------------------------------------------
 
-def diagnose(filepath: str, write_test: bool = False):
+def run_checks(filepath: str, write_test: bool = False) -> list[DiagnosticResult]:
     """
-    m4aファイルのタグ編集ができない原因を診断する
+    m4aファイルに対してすべての診断チェックを実行する（表示は行わない）
     Parameters:
         filepath (str): 診断対象のファイルパス
-        write_test (bool): True の場合、元ファイルのコピー (<stem>_writetest.m4a) に対して
-                           実際に save() を実行して書き込みテストを行う
+        write_test (bool): True の場合、元ファイルのコピーに対して実際に書き込みテストを行う
+    Returns:
+        list[DiagnosticResult]: 診断結果のリスト
     """
-    print(f'\n診断対象: {filepath}')
-    print('=' * 80)
-
     results: list[DiagnosticResult] = []
 
     # --- ファイル基本チェック ---
     exists_result = check_file_exists(filepath)
     results.append(exists_result)
     if exists_result.status == DiagnosticResult.NG:
-        _print_results(results)
-        return
+        return results
 
     results.append(check_extension(filepath))
     results.append(check_read_permission(filepath))
@@ -315,20 +536,109 @@ def diagnose(filepath: str, write_test: bool = False):
     results.append(check_file_lock(filepath))
 
     # --- ファイル構造チェック ---
-    print()
     results += check_mp4_atoms(filepath)
+    results += check_mp4_tag_layout(filepath)
     results.append(check_drm(filepath))
 
     # --- ライブラリチェック ---
-    print()
     results.append(check_tinytag_read(filepath))
     results.append(check_mutagen_available())
     results.append(check_mutagen_read(filepath))
     results.append(check_mutagen_write(filepath, dry_run=(not write_test)))
 
-    print()
-    _print_results(results)
-    _print_summary(results)
+    return results
+
+
+def diagnose(filepath: str, write_test: bool = False, jsonl_path: str = None):
+    """
+    m4aファイルのタグ編集ができない原因を診断する
+    Parameters:
+        filepath (str): 診断対象のファイルパス
+        write_test (bool): True の場合、元ファイルのコピー (<stem>_writetest.m4a) に対して
+                           実際に save() を実行して書き込みテストを行う
+        jsonl_path (str): 指定された場合、診断結果を JSON Lines 形式で書き出す
+    """
+    print(f'\n診断対象: {filepath}')
+    print('=' * 80)
+
+    results = run_checks(filepath, write_test=write_test)
+    if jsonl_path:
+        _write_jsonl(jsonl_path, {filepath: results})
+    if len(results) == 1 and results[0].status == DiagnosticResult.NG:
+        _print_results(results)
+    else:
+        print('\n\n')
+        _print_results(results)
+        _print_summary(results)
+    if jsonl_path:
+        print(f'JSON Lines レポート: {jsonl_path}')
+
+
+def collect_target_files(paths: list[str]) -> list[str]:
+    """
+    ファイル・ディレクトリ・glob パターンから診断対象のファイルを列挙する
+    ディレクトリの場合は配下の .m4a ファイル（大文字小文字を区別しない）を再帰的に探す
+    Parameters:
+        paths (list[str]): コマンドラインで指定されたパス
+    Returns:
+        list[str]: 重複を除いた診断対象ファイルのパス（指定順）
+    """
+    targets = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                targets += sorted(os.path.join(dirpath, name) for name in filenames
+                                  if name.lower().endswith('.m4a'))
+        elif glob.has_magic(path):
+            targets += sorted(p for p in glob.glob(path, recursive=True) if os.path.isfile(p))
+        else:
+            targets.append(path)
+    return list(dict.fromkeys(targets))
+
+
+def _run_checks_for_pool(filepath: str, write_test: bool) -> tuple[str, list[DiagnosticResult]]:
+    return filepath, run_checks(filepath, write_test=write_test)
+
+
+def diagnose_batch(filepaths: list[str], write_test: bool = False, jobs: int = None,
+                   jsonl_path: str = None):
+    """
+    複数のファイルをワーカープールで診断し、チェック項目ごとの集計を表示する
+    Parameters:
+        filepaths (list[str]): 診断対象のファイルパスのリスト
+        write_test (bool): True の場合、各ファイルのコピーに対して書き込みテストを行う
+        jobs (int): ワーカープロセス数。None の場合は CPU 数
+        jsonl_path (str): 指定された場合、診断結果を JSON Lines 形式で書き出す
+    """
+    print(f'\n診断対象: {len(filepaths)} ファイル')
+    print('=' * 80)
+
+    # ファイルごとの結果（指定順）
+    all_results: dict[str, list[DiagnosticResult]] = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_run_checks_for_pool, f, write_test) for f in filepaths]
+        for future in futures:
+            filepath, results = future.result()
+            all_results[filepath] = results
+            counts = Counter(r.status for r in results)
+            worst = next((st for st in (DiagnosticResult.NG, DiagnosticResult.WARN) if counts[st]),
+                         DiagnosticResult.OK)
+            print(DiagnosticResult(worst, filepath,
+                                   f'NG {counts[DiagnosticResult.NG]}, WARN {counts[DiagnosticResult.WARN]}'))
+
+    if jsonl_path:
+        _write_jsonl(jsonl_path, all_results)
+
+    _print_batch_summary(all_results)
+    if jsonl_path:
+        print(f'JSON Lines レポート: {jsonl_path}')
+
+
+def _write_jsonl(jsonl_path: str, all_results: dict[str, list[DiagnosticResult]]):
+    with open(jsonl_path, 'w', encoding='utf-8', newline='\n') as fout:
+        for filepath, results in all_results.items():
+            for r in results:
+                fout.write(json.dumps({'file': filepath, **r.to_dict()}, ensure_ascii=False) + '\n')
 
 
 def _print_results(results: list[DiagnosticResult]):
@@ -357,6 +667,30 @@ def _print_summary(results: list[DiagnosticResult]):
             print(f'  - {r.title}: {r.detail}')
 
 
+def _print_batch_summary(all_results: dict[str, list[DiagnosticResult]]):
+    print()
+    print('=' * 80)
+    print('チェック項目ごとの集計:')
+    per_check: dict[str, Counter] = {}
+    for results in all_results.values():
+        for r in results:
+            per_check.setdefault(r.title, Counter())[r.status] += 1
+    statuses = (DiagnosticResult.OK, DiagnosticResult.WARN, DiagnosticResult.NG, DiagnosticResult.INFO)
+    for title, counts in per_check.items():
+        detail = ', '.join(f'{st} {counts[st]}' for st in statuses if counts[st])
+        print(f'  - {title}: {detail}')
+
+    ng_files = [f for f, results in all_results.items()
+                if any(r.status == DiagnosticResult.NG for r in results)]
+    print()
+    if ng_files:
+        print(f'\033[91m[NG 項目のあるファイル] {len(ng_files)} / {len(all_results)}\033[0m')
+        for f in ng_files:
+            print(f'  - {f}')
+    else:
+        print(f'\033[92m[問題なし] {len(all_results)} ファイルすべてで NG 項目は検出されませんでした。\033[0m')
+
+
 # ---------------------------------------------------------------------------
 # エントリポイント
 # ---------------------------------------------------------------------------
@@ -365,13 +699,25 @@ def parse_args():
     parser = argparse.ArgumentParser(
         description='m4aファイルのタグ編集ができない原因を診断するツール'
     )
-    parser.add_argument('filepath', help='診断するm4aファイルのパス')
+    parser.add_argument('paths', nargs='+',
+        help='診断するm4aファイルのパス。ディレクトリ（配下の .m4a を再帰的に検索）や glob パターンも指定可')
     parser.add_argument(
         '--write-test',
         action='store_true',
         default=False,
         help='元ファイルのコピー (<stem>_writetest.m4a) に対して実際に書き込みテストを行う（デフォルト: dry-run）'
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=None,
+        help='複数ファイルを診断するときのワーカープロセス数（デフォルト: CPU 数）'
+    )
+    parser.add_argument(
+        '--jsonl',
+        default=None,
+        help='診断結果を JSON Lines 形式で書き出すファイル'
+    )
     return parser.parse_args()
 
 
@@ -388,4 +734,11 @@ if __name__ == '__main__':
 
         DiagnosticResult.__str__ = plain_str
 
-    diagnose(args.filepath, write_test=args.write_test)
+    filepaths = collect_target_files(args.paths)
+    if len(filepaths) == 1 and len(args.paths) == 1 and not os.path.isdir(args.paths[0]):
+        diagnose(filepaths[0], write_test=args.write_test, jsonl_path=args.jsonl)
+    elif not filepaths:
+        print('診断対象のファイルが見つかりません')
+        sys.exit(1)
+    else:
+        diagnose_batch(filepaths, write_test=args.write_test, jobs=args.jobs, jsonl_path=args.jsonl)
@@ -1,7 +1,13 @@
 import argparse
 import os
 import pprint
-from tinytag import TinyTag
+import sys
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from tag_cache import get_tag  # noqa: E402
+from extract_lyrics import is_audio_file  # noqa: E402
+from zip_tags import read_member_tag  # noqa: E402
 
 
 def show_metadata(audio_file: str):
@@ -15,54 +21,79 @@ def show_metadata(audio_file: str):
         return
     
     try:
-        tag = TinyTag.get(audio_file)
-        
-        print(f'File: {audio_file}')
-        print('=' * 80)
-        
-        # 基本情報
-        pprint.pprint(tag.as_dict())
-        # print(f'Title:        {tag.title}')
-        # print(f'Artist:       {tag.artist}')
-        # print(f'Album:        {tag.album}')
-        # print(f'Album Artist: {tag.albumartist}')
-        # print(f'Track:        {tag.track}')
-        # print(f'Disc:         {tag.disc}')
-        # print(f'Year:         {tag.year}')
-        # print(f'Genre:        {tag.genre}')
-        # print(f'Comment:      {tag.comment}')
-        # print(f'Composer:     {tag.composer}')
-        
-        # # ファイル情報
-        # print()
-        # print(f'Duration:     {tag.duration} seconds')
-        # print(f'Bitrate:      {tag.bitrate} kBit/s')
-        # print(f'Sample Rate:  {tag.samplerate} Hz')
-        # print(f'Channels:     {tag.channels}')
-        # print(f'File Size:    {tag.filesize} bytes')
-        
-        # 拡張情報（other）
-        if hasattr(tag, 'other') and tag.other:
-            print()
-            print('Other metadata:')
-            for key, value in tag.other.items():
-                # 歌詞は長いので別扱い
-                if key == 'lyrics':
-                    lyrics_preview = value[:100] + '...' if len(value) > 100 else value
-                    print(f'  {key}: {lyrics_preview}')
-                    print(f'         (Total length: {len(value)} characters)')
-                else:
-                    print(f'  {key}: {value}')
-        
-        print('=' * 80)
-        
+        _print_tag(audio_file, get_tag(audio_file))
     except Exception as e:
         print(f'Error reading metadata: {e}')
 
 
+def show_zip_metadata(zip_path: str):
+    """
+    zip 内のオーディオファイルのメタデータを、展開せずに表示
+    Parameters:
+        zip_path (str): zip ファイルのパス
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            infos = [info for info in zf.infolist() if not info.is_dir() and is_audio_file(info.filename)]
+            if not infos:
+                print(f'No audio files found in {zip_path}')
+            for info in infos:
+                try:
+                    _print_tag(f'{zip_path}:{info.filename}', read_member_tag(zf, info))
+                except Exception as e:
+                    print(f'Error reading metadata of {info.filename}: {e}')
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f'Error reading {zip_path}: {e}')
+
+
+def _print_tag(label: str, tag):
+    """ラベルとタグの内容を表示"""
+    print(f'File: {label}')
+    print('=' * 80)
+    
+    # 基本情報
+    pprint.pprint(tag.as_dict())
+    # print(f'Title:        {tag.title}')
+    # print(f'Artist:       {tag.artist}')
+    # print(f'Album:        {tag.album}')
+    # print(f'Album Artist: {tag.albumartist}')
+    # print(f'Track:        {tag.track}')
+    # print(f'Disc:         {tag.disc}')
+    # print(f'Year:         {tag.year}')
+    # print(f'Genre:        {tag.genre}')
+    # print(f'Comment:      {tag.comment}')
+    # print(f'Composer:     {tag.composer}')
+    
+    # # ファイル情報
+    # print()
+    # print(f'Duration:     {tag.duration} seconds')
+    # print(f'Bitrate:      {tag.bitrate} kBit/s')
+    # print(f'Sample Rate:  {tag.samplerate} Hz')
+    # print(f'Channels:     {tag.channels}')
+    # print(f'File Size:    {tag.filesize} bytes')
+    
+    # 拡張情報（other）
+    if hasattr(tag, 'other') and tag.other:
+        print()
+        print('Other metadata:')
+        for key, value in tag.other.items():
+            # 歌詞は長いので別扱い
+            if key == 'lyrics':
+                lyrics_preview = value[:100] + '...' if len(value) > 100 else value
+                print(f'  {key}: {lyrics_preview}')
+                print(f'         (Total length: {len(value)} characters)')
+            else:
+                print(f'  {key}: {value}')
+    
+    print('=' * 80)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Display audio file metadata using TinyTag')
-    parser.add_argument('audio_file', help='path to audio file')
+    parser.add_argument('audio_file', help='path to audio file, or a .zip file to show every audio file in it')
     args = parser.parse_args()
     
-    show_metadata(args.audio_file)
+    if args.audio_file.lower().endswith('.zip') and os.path.isfile(args.audio_file):
+        show_zip_metadata(args.audio_file)
+    else:
+        show_metadata(args.audio_file)